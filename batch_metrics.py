@@ -0,0 +1,141 @@
+import numpy as np
+from move import Move
+from defender import Defender
+from pokemon import Pokemon
+from pokemon_metrics import PokemonMetrics
+import type_chart
+
+
+class BatchMetrics:
+    SHADOW_POKEMON_BONUS_MULTIPLIER = PokemonMetrics.SHADOW_POKEMON_BONUS_MULTIPLIER
+    SAME_TYPE_ATTACK_BONUS_MULTIPLIER = PokemonMetrics.SAME_TYPE_ATTACK_BONUS_MULTIPLIER
+
+    def __init__(
+            self,
+            movesets: list[tuple[Pokemon, bool, Move, Move]],
+            atk_iv: int = 15,
+            defn_iv: int = 15,
+            hp_iv: int = 15,
+            level: float = 40,
+    ):
+        # every row is one (attacker, is_shadow, fast move, charged move) like a single PokemonMetrics
+        self.movesets = movesets
+        self.moves = []
+        self._move_ids = {}
+        fast_ids = [self._move_id(fast_move) for _, _, fast_move, _ in movesets]
+        charged_ids = [self._move_id(charged_move) for _, _, _, charged_move in movesets]
+        self._build_move_arrays()
+        self.fast = np.array(fast_ids, dtype=np.intp)
+        self.charged = np.array(charged_ids, dtype=np.intp)
+
+        cpm = PokemonMetrics.cpm(level)
+        self.is_shadow = np.array([is_shadow for _, is_shadow, _, _ in movesets], dtype=bool)
+        self.atk = np.array([(mon.base_atk + atk_iv) * cpm for mon, _, _, _ in movesets], dtype=float)
+        self.defn = np.array([(mon.base_defn + defn_iv) * cpm for mon, _, _, _ in movesets], dtype=float)
+        self.stm = np.array([(mon.base_stm + hp_iv) * cpm for mon, _, _, _ in movesets], dtype=float)
+        self.atk[self.is_shadow] *= self.SHADOW_POKEMON_BONUS_MULTIPLIER
+        self.defn[self.is_shadow] *= 0.8333333
+        self.dual_type = np.array([mon.dual_type_id for mon, _, _, _ in movesets], dtype=np.intp)
+        type_mask = np.array([mon.type_mask for mon, _, _, _ in movesets], dtype=np.int64)
+
+        self.fast_stab = self._stab(self.move_type[self.fast], type_mask)
+        self.charged_stab = self._stab(self.move_type[self.charged], type_mask)
+
+    def set_stats(self, atk: np.ndarray, defn: np.ndarray, stm: np.ndarray):
+        # Final stats (shadow bonus included) that broadcast against the rows, e.g. one moveset at many IVs/levels
+        self.atk = atk
+        self.defn = defn
+        self.stm = stm
+
+    def __len__(self):
+        return len(self.movesets)
+
+    def _move_id(self, move: Move) -> int:
+        if id(move) not in self._move_ids:
+            self._move_ids[id(move)] = len(self.moves)
+            self.moves.append(move)
+        return self._move_ids[id(move)]
+
+    def _build_move_arrays(self):
+        self.move_power = np.array([move.power for move in self.moves], dtype=float)
+        self.move_energy = np.array([move.energy_delta for move in self.moves], dtype=float)
+        self.move_duration = np.array([move.duration_s for move in self.moves], dtype=float)
+        self.move_dws = np.array([move.damage_window_start_s for move in self.moves], dtype=float)
+        self.move_type = np.array([move.type_id for move in self.moves], dtype=np.intp)
+
+    def _stab(self, move_type: np.ndarray, type_mask: np.ndarray) -> np.ndarray:
+        return np.where((type_mask >> move_type) & 1, self.SAME_TYPE_ATTACK_BONUS_MULTIPLIER, 1.0)
+
+    def intake(self, defender: Defender) -> tuple[np.ndarray, np.ndarray]:
+        # same averages as PokemonMetrics.intake, over every defender fast x charged pair at once
+        f_moves = defender.pokemon.fast_moves if defender.fast_move is None else [defender.fast_move]
+        c_moves = defender.pokemon.charged_moves if defender.charged_move is None else [defender.charged_move]
+        f_dmg = self.defender_damage(f_moves, defender)
+        c_dmg = self.defender_damage(c_moves, defender)
+        c_energy = np.array([move.energy_delta for move in c_moves], dtype=float)
+        f_dur = np.array([move.duration_s for move in f_moves], dtype=float) + 2
+        c_dur = np.array([move.duration_s for move in c_moves], dtype=float) + 2
+        n = np.maximum(1, 3 * c_energy / 100)
+        cycle_dmg = n * f_dmg[:, :, None] + c_dmg[:, None, :]
+        t = cycle_dmg / (n + 1)
+        y = cycle_dmg / (n * f_dur[:, None] + c_dur[None, :])
+        x = (self.move_energy[self.charged] * 0.5) + (self.move_energy[self.fast] * 0.5) + (0.5 * t.mean(axis=(1, 2)))
+        return x, y.mean(axis=(1, 2))
+
+    def defender_damage(self, moves: list[Move], defender: Defender) -> np.ndarray:
+        # damage of each of the defender's moves to each row, shaped (rows, moves)
+        move_type = np.array([move.type_id for move in moves], dtype=np.intp)
+        power = np.array([move.power for move in moves], dtype=float)
+        stab = self._stab(move_type, np.int64(defender.type_mask))
+        multiplier = stab * type_chart.DUAL_TYPE_TABLE[move_type[None, :], self.dual_type[:, None]]
+        return 0.5 * defender.atk / self.defn[:, None] * power * multiplier + 0.5
+
+    def move_damage(self, defender: Defender) -> tuple[np.ndarray, np.ndarray]:
+        # damage of each row's fast and charged move to the defender
+        dual_type_table = type_chart.DUAL_TYPE_TABLE
+        fast_multiplier = self.fast_stab * dual_type_table[self.move_type[self.fast], defender.dual_type_id]
+        charged_multiplier = self.charged_stab * dual_type_table[self.move_type[self.charged], defender.dual_type_id]
+        fdmg = 0.5 * self.atk / defender.defense * self.move_power[self.fast] * fast_multiplier + 0.5
+        cdmg = 0.5 * self.atk / defender.defense * self.move_power[self.charged] * charged_multiplier + 0.5
+        return fdmg, cdmg
+
+    def _move_dps(self, defender: Defender) -> tuple[np.ndarray, np.ndarray]:
+        fdmg, cdmg = self.move_damage(defender)
+        return fdmg / self.move_duration[self.fast], cdmg / self.move_duration[self.charged]
+
+    def intake_y(self, defender: Defender) -> np.ndarray:
+        # the damage per second taken, which unlike x doesn't depend on the rows' moves
+        if defender.pokemon is not None:
+            return self.intake(defender)[1]
+        return defender.dps / self.defn
+
+    def dps_bound(self, defender: Defender) -> np.ndarray:
+        # calculate_metrics always ends up with a dps between the fast and the charged move's dps
+        return np.maximum(*self._move_dps(defender))
+
+    def calculate_metrics(self, defender: Defender) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if defender.pokemon is not None:
+            x, y = self.intake(defender)
+        else:
+            x = (self.move_energy[self.charged] * 0.5) + (self.move_energy[self.fast] * 0.5)
+            y = defender.dps / self.defn
+        fdps, cdps = self._move_dps(defender)
+        fe = self.move_energy[self.fast]
+        ce = self.move_energy[self.charged]
+
+        fdur = self.move_duration[self.fast]
+        cdur = self.move_duration[self.charged]
+        cdws = self.move_dws[self.charged]
+
+        ce = np.where(ce >= 100, ce + 0.5 * fe + 0.5 * y * cdws, ce)
+
+        feps = fe / fdur
+        ceps = ce / cdur
+
+        st = self.stm / y
+        dps0 = (fdps * ceps + cdps * feps) / (ceps + feps)
+        dps = dps0 + (((cdps - fdps) / (ceps + feps)) * (0.5 - (x / self.stm)) * y)
+        dps = np.where(dps > cdps, cdps, np.where(dps < fdps, fdps, dps))
+        tdo = dps * st
+        er = (dps ** 3 * tdo) ** 0.25
+        return dps, tdo, er
@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from synthetic_gm import write_gm, write_tables
+from data_registry import REGISTRY
+
+SCALES = {
+    'small': {'pokemon': 100, 'moves': 100},
+    'medium': {'pokemon': 300, 'moves': 200},
+    'large': {'pokemon': 800, 'moves': 350},
+}
+QUERY_TYPE = 'water'
+MATCHUPS = 2000  # PokemonMetrics timed by the calculate_metrics phase
+
+
+def _phases(metrics_class, gm_path: str) -> list[tuple[str, object]]:
+    # (name, fn) pairs, fn runs the phase once and returns how many items it handled for the throughput
+    from pokemon_metrics import PokemonMetrics
+    from defender import Defender
+
+    def gm_load():
+        with open(gm_path) as gm_file:
+            return len(json.load(gm_file))
+
+    def metrics_init():
+        REGISTRY.forget_gm()  # a full build includes parsing the gm, which the registry would otherwise share
+        return len(metrics_class(use_snapshot=False, gm_path=gm_path).pokemon_list)
+
+    def metrics_init_snapshot():
+        return len(metrics_class(use_snapshot=True, gm_path=gm_path).pokemon_list)
+
+    metrics = metrics_class(use_snapshot=True, gm_path=gm_path)
+
+    def get_list_of_moves():
+        return len(metrics.get_list_of_moves())
+
+    def get_list_of_pokemon():
+        return len(metrics.get_list_of_pokemon(hidden_power=metrics.include_hidden_power))
+
+    rows, _ = metrics._moveset_rows(unique=True)
+    defender_base = (metrics.get_list_of_raid_weak_to(QUERY_TYPE) or metrics.pokemon_list)[0]
+
+    def calculate_metrics():
+        PokemonMetrics.clear_intake_cache()
+        defender = Defender(defender_mon=defender_base)
+        for attacker_base, is_shadow, fast_move, charged_move in rows[:MATCHUPS]:
+            PokemonMetrics(attacker_base, fast_move, charged_move, is_shadow=is_shadow, defender=defender).er
+        return len(rows[:MATCHUPS])
+
+    def top_attackers(**kwargs):
+        def run():
+            PokemonMetrics.clear_intake_cache()
+            with contextlib.redirect_stdout(io.StringIO()):  # the per defender progress lines
+                metrics.top_attackers_for_type(QUERY_TYPE, **kwargs)
+            return len(rows) * len(metrics.get_list_of_raid_weak_to(QUERY_TYPE))
+        return run
+
+    return [
+        ('gm_load', gm_load),
+        ('metrics_init', metrics_init),
+        ('metrics_init_snapshot', metrics_init_snapshot),
+        ('get_list_of_moves', get_list_of_moves),
+        ('get_list_of_pokemon', get_list_of_pokemon),
+        ('calculate_metrics', calculate_metrics),
+        ('top_attackers_python', top_attackers(backend='python')),
+        ('top_attackers_numpy', top_attackers(backend='numpy')),
+        ('top_attackers_numpy_top100', top_attackers(backend='numpy', top=100)),
+    ]
+
+
+def _measure(fn, repeat: int) -> dict:
+    # best wall time of repeat runs, then one more run under tracemalloc for the peak memory
+    best = None
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': best,
+        'items': items,
+        'items_per_second': items / best if best else None,
+        'peak_mb': peak / (1024 * 1024),
+    }
+
+
+def run(scales: list[str], repeat: int, work_dir: str) -> dict:
+    # every scale gets its own synthetic gm next to one shared type chart and cpm table
+    from metrics import Metrics
+    write_tables(work_dir)
+    REGISTRY.configure(work_dir)
+    results = {}
+    for scale in scales:
+        gm_path = os.path.join(work_dir, scale, REGISTRY.GM_FILE)
+        write_gm(gm_path, **SCALES[scale])
+        results[scale] = {}
+        for name, fn in _phases(Metrics, gm_path):
+            results[scale][name] = _measure(fn, repeat)
+            print(_format_row(scale, name, results[scale][name]), flush=True)
+    return results
+
+
+def _format_row(scale: str, phase: str, result: dict) -> str:
+    return (
+        f'{scale : <8} {phase : <28} {result["seconds"] * 1000 : >10.1f} ms '
+        f'{result["items_per_second"] or 0 : >12.0f} items/s {result["peak_mb"] : >8.1f} MB'
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    # a phase regressed when it's more than tolerance slower than the baseline, phases missing from either are skipped
+    regressions = []
+    for scale, phases in results.items():
+        for phase, result in phases.items():
+            expected = baseline.get(scale, {}).get(phase)
+            if expected is None:
+                continue
+            if result['seconds'] > expected['seconds'] * (1 + tolerance):
+                regressions.append(
+                    f'{scale} {phase}: {result["seconds"] * 1000:.1f} ms, baseline {expected["seconds"] * 1000:.1f} ms'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time Metrics phases on synthetic game masters')
+    parser.add_argument('--scales', default='small,medium', help=f'comma separated, out of {", ".join(SCALES)}')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help='results json to compare against, exits with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--save', help='write the results json here, e.g. to make a new baseline')
+    args = parser.parse_args()
+
+    scales = args.scales.split(',')
+    for scale in scales:
+        if scale not in SCALES:
+            parser.error(f'Unknown scale {scale}')
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run(scales, args.repeat, work_dir)
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump(results, results_file, indent=4)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from move import Move
+from pokemon import Pokemon
+
+
+class Catalog:
+    CLASSES = ['legendary', 'mythical', 'mega', 'ultra_beast']
+
+    def __init__(self, moves: list[Move] = None, pokemon: list[Pokemon] = None):
+        self.moves = []
+        self.pokemon = []
+        self.positions = {}
+        self.moves_by_name = {}
+        self.pokemon_by_name = {}
+        self.pokemon_by_tid = {}
+        self.pokemon_by_type = {}
+        self.pokemon_by_type_pair = {}
+        self.pokemon_by_class = {pokemon_class: [] for pokemon_class in self.CLASSES}
+        self.move_variants = {}
+        self.add_moves(moves or [])
+        self.add_pokemon(pokemon or [])
+
+    def add_moves(self, moves: list[Move]):
+        for move in moves:
+            self.moves.append(move)
+            self.moves_by_name.setdefault(move.name, move)  # the first move with a name wins, like the old linear scan
+
+    def add_pokemon(self, pokemon: list[Pokemon]):
+        for mon in pokemon:
+            self.positions[id(mon)] = len(self.pokemon)
+            self.pokemon.append(mon)
+            self.pokemon_by_name.setdefault(mon.name, []).append(mon)
+            self.pokemon_by_tid.setdefault(mon.tid, []).append(mon)  # megas share the tid of their base form
+            self.pokemon_by_type.setdefault(mon.type_1, []).append(mon)
+            if mon.type_2 != '':
+                self.pokemon_by_type.setdefault(mon.type_2, []).append(mon)
+            self.pokemon_by_type_pair.setdefault((mon.type_1, mon.type_2), []).append(mon)
+            for pokemon_class in self.classes_of(mon):
+                self.pokemon_by_class[pokemon_class].append(mon)
+
+    @staticmethod
+    def classes_of(mon: Pokemon) -> list[str]:
+        flags = [mon.legendary, mon.mythical, mon.is_mega, mon.ultra_beast]
+        return [pokemon_class for pokemon_class, flag in zip(Catalog.CLASSES, flags) if flag]
+
+    def move(self, name: str) -> Move | None:
+        return self.moves_by_name.get(name)
+
+    def move_variant(self, move: Move, **overrides) -> Move:
+        # every pokemon gets the same variant object instead of its own copy
+        key = (id(move), tuple(sorted(overrides.items())))
+        variant = self.move_variants.get(key)
+        if variant is None:
+            variant = self.move_variants[key] = move.variant(**overrides)
+        return variant
+
+    def add_move_variant(self, move: Move, variant: Move, **overrides):
+        # a variant made before, e.g. one unpickled from a snapshot, that move_variant should hand out again
+        self.move_variants.setdefault((id(move), tuple(sorted(overrides.items()))), variant)
+
+    def keep_move_variants(self, catalog: 'Catalog'):
+        # the variants of another catalog whose base move is in this one too, both have to be alive for the ids
+        move_ids = {id(move) for move in self.moves}
+        for key, variant in catalog.move_variants.items():
+            if key[0] in move_ids:
+                self.move_variants.setdefault(key, variant)
+
+    def pokemon_named(self, name: str) -> Pokemon | None:
+        matches = self.pokemon_by_name.get(name)
+        return matches[0] if matches else None
+
+    def all_pokemon_named(self, name: str) -> list[Pokemon]:
+        return self.pokemon_by_name.get(name, [])
+
+    def pokemon_with_tid(self, tid: str) -> list[Pokemon]:
+        return self.pokemon_by_tid.get(tid, [])
+
+    def pokemon_of_type(self, typing: str) -> list[Pokemon]:
+        return self.pokemon_by_type.get(typing, [])
+
+    def pokemon_of_classes(self, classes: list[str]) -> list[Pokemon]:
+        # keeps catalog order, a pokemon in several of the classes only shows up once
+        selected = {id(mon): mon for pokemon_class in classes for mon in self.pokemon_by_class[pokemon_class]}
+        return [selected[key] for key in sorted(selected, key=self.positions.get)]
@@ -0,0 +1,91 @@
+import json
+import os
+import numpy as np
+
+COUNTER_MATRIX_VERSION = 1
+
+
+def counter_matrix_path(gm_path: str, scores_hash: str, hidden_power: bool) -> str:
+    # keyed like the result cache, see Metrics.scores_hash, since the scores depend on the cpm table too
+    root, _ = os.path.splitext(gm_path)
+    return f'{root}.{scores_hash[:16]}.{"hp" if hidden_power else "nohp"}.counters'
+
+
+class CounterMatrix:
+    # dps/tdo/er of every moveset row against every raid boss, built once per gm and cpm table.
+    # <path>.npy holds a float64 array shaped (bosses, 3, rows) that is opened with mmap_mode='r', so every
+    # process that loads it shares the same pages. <path>.json holds the row and boss keys (see MatchupCache)
+    # in array order. Pickling one only sends the path, the worker maps the file itself.
+
+    def __init__(self, path: str, scores: np.ndarray, row_keys: list[tuple], boss_keys: list[tuple]):
+        self.path = path
+        self.scores = scores
+        self.row_keys = row_keys
+        self.boss_keys = boss_keys
+        self.columns = {key: column for column, key in enumerate(row_keys)}
+        self.boss_indexes = {key: index for index, key in enumerate(boss_keys)}
+
+    def __reduce__(self):
+        return CounterMatrix.load, (self.path,)
+
+    def __len__(self):
+        return len(self.boss_keys)
+
+    @classmethod
+    def build(cls, path: str, row_keys: list[tuple], boss_keys: list[tuple], score_boss) -> 'CounterMatrix':
+        # score_boss(index) gives the (3, rows) scores of boss_keys[index], written straight into the mapped file
+        tmp_path = f'{path}.{os.getpid()}.tmp.npy'
+        scores = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float64, shape=(len(boss_keys), 3, len(row_keys))
+        )
+        for index in range(len(boss_keys)):
+            scores[index] = score_boss(index)
+        scores.flush()
+        del scores
+        tmp_index_path = f'{path}.{os.getpid()}.tmp.json'
+        with open(tmp_index_path, 'w') as index_file:
+            json.dump({'version': COUNTER_MATRIX_VERSION, 'rows': row_keys, 'bosses': boss_keys}, index_file)
+        os.replace(tmp_path, path + '.npy')
+        os.replace(tmp_index_path, path + '.json')
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CounterMatrix | None':
+        try:
+            with open(path + '.json') as index_file:
+                index = json.load(index_file)
+            scores = np.load(path + '.npy', mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        expected_shape = (len(index['bosses']), 3, len(index['rows']))
+        if index.get('version') != COUNTER_MATRIX_VERSION or scores.shape != expected_shape:
+            return None
+        return cls(path, scores, [tuple(key) for key in index['rows']], [tuple(key) for key in index['bosses']])
+
+    def covers(self, row_keys: list[tuple], boss_keys: list[tuple]) -> bool:
+        return all(key in self.columns for key in row_keys) and all(key in self.boss_indexes for key in boss_keys)
+
+    def boss_scores(self, boss_key: tuple, row_keys: list[tuple] = None) -> np.ndarray:
+        # (3, rows) scores against one boss, a read-only view unless row_keys picks out some of the rows
+        scores = self.scores[self.boss_indexes[boss_key]]
+        if row_keys is None:
+            return scores
+        return scores[:, [self.columns[key] for key in row_keys]]
+
+    def averages(self, boss_keys: list[tuple], row_keys: list[tuple] = None) -> np.ndarray:
+        # summed one boss at a time in the given order, like the numpy backend, so the averages match it exactly
+        columns = None if row_keys is None else [self.columns[key] for key in row_keys]
+        totals = np.zeros((3, len(self.row_keys) if columns is None else len(columns)))
+        for boss_key in boss_keys:
+            scores = self.scores[self.boss_indexes[boss_key]]
+            totals += scores if columns is None else scores[:, columns]
+        return totals / len(boss_keys)
+
+
+def remove_stale_counter_matrices(gm_path: str, scores_hash: str):
+    directory = os.path.dirname(gm_path) or '.'
+    prefix = os.path.splitext(os.path.basename(gm_path))[0] + '.'
+    for file_name in os.listdir(directory):
+        if file_name.startswith(prefix) and file_name.endswith(('.counters.npy', '.counters.json')):
+            if file_name[len(prefix):].split('.')[0] != scores_hash[:16]:
+                os.remove(os.path.join(directory, file_name))
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+from types import MappingProxyType
+
+DATA_DIR_ENV = 'POGO_DATA_DIR'
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')  # not the working directory
+
+
+class DataRegistry:
+    # The tables in the data directory, each one read the first time it's asked for and then shared by every
+    # module. Nothing is read on import. The cpm and type tables are read-only, so processes forked after
+    # preload() get them without reading anything. The gm is read again once the file changes.
+    CPM_FILE = 'cpm.json'
+    TYPE_FILE = 'type_effectiveness.json'
+    GM_FILE = 'pokeminers_gm.json'
+
+    def __init__(self, data_dir: str = None):
+        self._data_dir = data_dir
+        self._tables = {}
+        self._hashes = {}  # table name -> sha256 of its contents, in file order
+        self._gm = None  # (path, inode, mtime_ns, size, gm)
+
+    @property
+    def data_dir(self) -> str:
+        return self._data_dir or os.environ.get(DATA_DIR_ENV) or DEFAULT_DATA_DIR
+
+    def configure(self, data_dir: str):
+        # Tables that are already loaded stay in use, e.g. in the type ids of every Move and Pokemon.
+        # So changing the directory after that is an error.
+        data_dir = os.fspath(data_dir)
+        if self._tables and os.path.abspath(data_dir) != os.path.abspath(self.data_dir):
+            raise RuntimeError(f'The data tables were already loaded from {self.data_dir}')
+        self._data_dir = data_dir
+        os.environ[DATA_DIR_ENV] = data_dir  # spawned processes start out with the same directory
+
+    def path(self, file_name: str) -> str:
+        return os.path.join(self.data_dir, file_name)
+
+    @property
+    def gm_path(self) -> str:
+        return self.path(self.GM_FILE)
+
+    def _load_json(self, file_name: str):
+        with open(self.path(file_name)) as table_file:
+            return json.load(table_file)
+
+    def _load_table(self, name: str, file_name: str, freeze):
+        table = self._tables.get(name)
+        if table is None:
+            rows = self._load_json(file_name)
+            self._hashes[name] = hashlib.sha256(json.dumps(rows).encode()).hexdigest()
+            table = self._tables[name] = freeze(rows)
+        return table
+
+    def cpm(self) -> tuple[float, ...]:
+        return self._load_table('cpm', self.CPM_FILE, tuple)
+
+    def type_effectiveness(self) -> MappingProxyType:
+        return self._load_table(
+            'type_effectiveness',
+            self.TYPE_FILE,
+            lambda rows: MappingProxyType({typing: MappingProxyType(row) for typing, row in rows.items()})
+        )
+
+    def table_hash(self, name: str) -> str:
+        # Hash of the table that is in use. It changes with the table's key order too, since type ids are
+        # given out in that order.
+        getattr(self, name)()
+        return self._hashes[name]
+
+    def gm(self, gm_path: str = None) -> list:
+        # the parsed gm, shared until the file is replaced or its mtime or size changes
+        gm_path = gm_path or self.gm_path
+        stat = os.stat(gm_path)
+        key = (gm_path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._gm is not None and self._gm[:4] == key:
+            return self._gm[4]
+        with open(gm_path) as gm_file:
+            gm = json.load(gm_file)
+        self._gm = (*key, gm)
+        return gm
+
+    def forget_gm(self):
+        # the next gm() reads the file again even if it didn't change, e.g. to time the parse
+        self._gm = None
+
+    def preload(self):
+        # loads the cpm and type tables, and builds type_chart's arrays from them, ahead of forking workers
+        import type_chart
+        self.cpm()
+        type_chart.load_tables()
+
+
+class RegistryTable:
+    # A class attribute that reads a registry table on first use instead of at class definition.
+    # After that the table replaces it on the class, so later lookups are plain attribute lookups again.
+    def __init__(self, table: str):
+        self.table = table
+        self.attribute = None
+
+    def __set_name__(self, owner, attribute: str):
+        self.attribute = attribute
+
+    def __get__(self, instance, owner):
+        table = getattr(REGISTRY, self.table)()
+        setattr(owner, self.attribute, table)
+        return table
+
+
+REGISTRY = DataRegistry()
@@ -0,0 +1,232 @@
+import argparse
+import csv
+import heapq
+import json
+import os
+import zipfile
+import numpy as np
+from metrics import Metrics
+from pokemon import Pokemon
+from results import ResultColumns
+from matchup_cache import MatchupCache
+from counter_matrix import CounterMatrix
+from data_registry import REGISTRY, DATA_DIR_ENV
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.npz': 'columnar'}
+CHUNK_ROWS = 4096  # rows formatted, and per boss scores read, per write
+BUFFER_BYTES = 1 << 20
+METRICS = ['dps', 'tdo', 'er']
+
+
+def ranked_rows(columns: ResultColumns, sort_by: int = 1, top: int = None) -> np.ndarray:
+    # Row indexes from best to worst. Ties keep their original order like ResultColumns.order.
+    # With top only those rows are picked out, with a heap instead of sorting all of them.
+    if top is None or top >= len(columns):
+        return columns.order(sort_by)
+    metric = [columns.dps, columns.tdo, columns.er][sort_by - 1].tolist()
+    return np.array(heapq.nlargest(top, range(len(metric)), key=metric.__getitem__), dtype=np.intp)
+
+
+class Rankings:
+    # The ranked rows of a ResultColumns, and with bosses every row's scores against each of them.
+    # Those are read from the counter matrix a chunk of rows at a time, so they're never all in memory.
+    FIELDS = [
+        'rank',
+        'name',
+        'is_shadow',
+        'fast_move',
+        'elite_fast_move',
+        'charged_move',
+        'elite_charged_move',
+    ] + METRICS
+
+    def __init__(
+            self,
+            columns: ResultColumns,
+            order: np.ndarray,
+            bosses: list[Pokemon] = None,
+            counter_matrix: CounterMatrix = None
+    ):
+        self.columns = columns
+        self.order = order
+        self.bosses = bosses or []
+        self.counter_matrix = counter_matrix
+        if self.bosses and counter_matrix is None:
+            raise ValueError('Per boss scores need a counter matrix covering the bosses')
+
+    def __len__(self):
+        return len(self.order)
+
+    def chunks(self):
+        # (ranked row indexes, their (rows, bosses, 3) scores or None) for every CHUNK_ROWS rows
+        for start in range(0, len(self.order), CHUNK_ROWS):
+            rows = self.order[start:start + CHUNK_ROWS]
+            yield rows, self._boss_scores(rows) if self.bosses else None
+
+    def _boss_scores(self, rows: np.ndarray) -> np.ndarray:
+        columns = self.columns
+        matrix_columns = [
+            self.counter_matrix.columns[MatchupCache.row_key(
+                columns.pokemon[columns.attacker[row]],
+                bool(columns.is_shadow[row]),
+                columns.moves[columns.fast_move[row]],
+                columns.moves[columns.charged_move[row]]
+            )]
+            for row in rows
+        ]
+        boss_indexes = [self.counter_matrix.boss_indexes[MatchupCache.defender_key(boss)] for boss in self.bosses]
+        scores = self.counter_matrix.scores[np.ix_(boss_indexes, [0, 1, 2], matrix_columns)]
+        return scores.transpose(2, 0, 1)
+
+    def records(self):
+        # (one list per FIELDS, (bosses, 3) scores or None) in rank order
+        columns = self.columns
+        rank = 0
+        for rows, boss_scores in self.chunks():
+            names = [columns.name(row) for row in rows]
+            fast_moves = [columns.moves[move].name for move in columns.fast_move[rows]]
+            charged_moves = [columns.moves[move].name for move in columns.charged_move[rows]]
+            values = zip(
+                names,
+                columns.is_shadow[rows].tolist(),
+                fast_moves,
+                columns.elite_fast_move[rows].tolist(),
+                charged_moves,
+                columns.elite_charged_move[rows].tolist(),
+                columns.dps[rows].tolist(),
+                columns.tdo[rows].tolist(),
+                columns.er[rows].tolist()
+            )
+            for i, row_values in enumerate(values):
+                rank += 1
+                yield [rank, *row_values], None if boss_scores is None else boss_scores[i].tolist()
+
+
+def write_csv(rankings: Rankings, path: str):
+    # per boss scores get a <boss> dps, <boss> tdo and <boss> er column each
+    with open(path, 'w', newline='', buffering=BUFFER_BYTES) as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(Rankings.FIELDS + [f'{boss.name} {metric}' for boss in rankings.bosses for metric in METRICS])
+        batch = []
+        for record, boss_scores in rankings.records():
+            if boss_scores is not None:
+                record += [value for scores in boss_scores for value in scores]
+            batch.append(record)
+            if len(batch) == CHUNK_ROWS:
+                writer.writerows(batch)
+                batch = []
+        writer.writerows(batch)
+
+
+def write_jsonl(rankings: Rankings, path: str):
+    # one object per row, per boss scores under "bosses" in the same order for every row
+    boss_names = [boss.name for boss in rankings.bosses]
+    with open(path, 'w', buffering=BUFFER_BYTES) as jsonl_file:
+        lines = []
+        for record, boss_scores in rankings.records():
+            entry = dict(zip(Rankings.FIELDS, record))
+            if boss_scores is not None:
+                entry['bosses'] = [
+                    {'name': name, 'dps': dps, 'tdo': tdo, 'er': er}
+                    for name, (dps, tdo, er) in zip(boss_names, boss_scores)
+                ]
+            lines.append(json.dumps(entry))
+            if len(lines) == CHUNK_ROWS:
+                jsonl_file.write('\n'.join(lines) + '\n')
+                lines = []
+        if lines:
+            jsonl_file.write('\n'.join(lines) + '\n')
+
+
+def write_columnar(rankings: Rankings, path: str):
+    # An uncompressed .npz that np.load reads, one array per ResultColumns column in rank order.
+    # attacker, fast_move and charged_move index into the pokemon and moves name arrays. With bosses
+    # boss_scores is shaped (rows, bosses, 3) and streamed into the archive a chunk at a time.
+    columns = rankings.columns
+    order = rankings.order
+    arrays = {name: getattr(columns, name)[order] for name in ResultColumns.COLUMNS}
+    arrays['rank'] = np.arange(1, len(order) + 1, dtype=np.int32)
+    arrays['pokemon'] = np.array([mon.name for mon in columns.pokemon], dtype=str)
+    arrays['moves'] = np.array([move.name for move in columns.moves], dtype=str)
+    arrays['bosses'] = np.array([boss.name for boss in rankings.bosses], dtype=str)
+    with open(path, 'wb', buffering=BUFFER_BYTES) as npz_file, zipfile.ZipFile(npz_file, 'w') as archive:
+        for name, array in arrays.items():
+            with archive.open(name + '.npy', 'w', force_zip64=True) as member:
+                np.lib.format.write_array(member, array, allow_pickle=False)
+        if rankings.bosses:
+            with archive.open('boss_scores.npy', 'w', force_zip64=True) as member:
+                np.lib.format.write_array_header_2_0(member, {
+                    'descr': np.lib.format.dtype_to_descr(np.dtype(np.float64)),
+                    'fortran_order': False,
+                    'shape': (len(order), len(rankings.bosses), 3),
+                })
+                for _, boss_scores in rankings.chunks():
+                    member.write(np.ascontiguousarray(boss_scores, dtype=np.float64).tobytes())
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'columnar': write_columnar}
+
+
+def export_rankings(
+        metrics: Metrics,
+        typing: str,
+        path: str,
+        sort_by: int = 1,
+        top: int = None,
+        every_moveset: bool = False,
+        per_boss: bool = False,
+        backend: str = 'numpy',
+        export_format: str = None
+) -> int:
+    # Writes top_attackers_for_type's ranking, or every moveset's with every_moveset, and returns the row count.
+    # The format comes from the file extension unless export_format is given.
+    export_format = export_format or FORMATS.get(os.path.splitext(path)[1].lower())
+    if export_format not in WRITERS:
+        raise ValueError(f'Unknown export format for {path}, use one of {", ".join(FORMATS)}')
+    if per_boss and backend == 'simulate':
+        raise ValueError('Per boss scores come from the closed form counter matrix, not the simulator')
+    if every_moveset:
+        columns = metrics.movesets_for_type(typing, backend)
+    else:
+        columns = metrics.top_attackers_for_type(typing, sort_by, backend=backend, columnar=True, top=top)
+    bosses = metrics.get_list_of_raid_weak_to(typing) if per_boss else []
+    counter_matrix = metrics.covering_counter_matrix(bosses) if bosses else None
+    rankings = Rankings(columns, ranked_rows(columns, sort_by, top), bosses, counter_matrix)
+    WRITERS[export_format](rankings, path)
+    return len(rankings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the top attackers for a type as csv, jsonl or npz')
+    parser.add_argument('type')
+    parser.add_argument('path', help=f'output file, the format comes from its extension ({", ".join(FORMATS)})')
+    parser.add_argument('--sort-by', type=int, default=1, choices=[1, 2, 3], help='1 dps, 2 tdo, 3 er')
+    parser.add_argument('--top', type=int, help='only the best this many rows')
+    parser.add_argument('--every-moveset', action='store_true', help="every moveset, not just each attacker's best")
+    parser.add_argument('--per-boss', action='store_true', help="add every row's scores against each boss")
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--hidden-power', action='store_true')
+    parser.add_argument('--format', choices=list(WRITERS), help='overrides the extension')
+    parser.add_argument(
+        '--data-dir', help=f'where the gm, cpm and type tables are, {DATA_DIR_ENV} or data/ next to the code by default'
+    )
+    args = parser.parse_args()
+    if args.data_dir:
+        REGISTRY.configure(args.data_dir)
+    metrics = Metrics(hidden_power=args.hidden_power)
+    rows = export_rankings(
+        metrics,
+        args.type,
+        args.path,
+        args.sort_by,
+        args.top,
+        args.every_moveset,
+        args.per_boss,
+        args.backend,
+        args.format
+    )
+    print(f'Wrote {rows} rows to {args.path}')
+
+
+if __name__ == '__main__':
+    main()
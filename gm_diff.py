@@ -0,0 +1,54 @@
+import re
+
+
+class GmUpdate:
+    # What changed between two game masters, by templateId, and how much cached work had to be redone
+    def __init__(self):
+        self.added_moves = []
+        self.removed_moves = []
+        self.changed_moves = []
+        self.added_pokemon = []
+        self.removed_pokemon = []
+        self.changed_pokemon = []
+        self.rebuilt_pokemon = []
+        self.recomputed_matchups = 0
+
+    def __bool__(self):
+        return any([
+            self.added_moves,
+            self.removed_moves,
+            self.changed_moves,
+            self.added_pokemon,
+            self.removed_pokemon,
+            self.changed_pokemon,
+        ])
+
+    def __str__(self):
+        return (
+            f'moves: {len(self.added_moves)} added, {len(self.removed_moves)} removed, '
+            f'{len(self.changed_moves)} changed | '
+            f'pokemon: {len(self.added_pokemon)} added, {len(self.removed_pokemon)} removed, '
+            f'{len(self.changed_pokemon)} changed, {len(self.rebuilt_pokemon)} rebuilt | '
+            f'{self.recomputed_matchups} cached matchups recomputed'
+        )
+
+
+def _entries(gm: list, pattern: str) -> dict:
+    return {entry['templateId']: entry for entry in gm if re.search(pattern, entry['templateId'])}
+
+
+def diff_gms(old_gm: list, new_gm: list) -> GmUpdate:
+    update = GmUpdate()
+    for pattern, added, removed, changed in [
+        (r'^V[0-9]{4}_MOVE_', update.added_moves, update.removed_moves, update.changed_moves),
+        (r'^V[0-9]{4}_POKEMON_', update.added_pokemon, update.removed_pokemon, update.changed_pokemon),
+    ]:
+        old_entries = _entries(old_gm, pattern)
+        new_entries = _entries(new_gm, pattern)
+        for tid, entry in new_entries.items():
+            if tid not in old_entries:
+                added.append(tid)
+            elif entry != old_entries[tid]:
+                changed.append(tid)
+        removed += [tid for tid in old_entries if tid not in new_entries]
+    return update
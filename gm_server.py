@@ -0,0 +1,157 @@
+import argparse
+import copy
+import gzip
+import hashlib
+import http.server
+import json
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from synthetic_gm import generate_gm, write_data_dir
+from data_registry import REGISTRY
+
+
+class GmHandler(http.server.BaseHTTPRequestHandler):
+    # Answers like the raw github url of the gm: ETag and Last-Modified on every 200, a 304 when If-None-Match
+    # (or without it If-Modified-Since) still matches and a gzip body when the request accepts one
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_none_match is not None:
+            not_modified = if_none_match == server.etag
+        elif if_modified_since is not None:
+            not_modified = server.modified <= int(parsedate_to_datetime(if_modified_since).timestamp())
+        else:
+            not_modified = False
+        if not_modified:
+            self.send_response(304)
+            self.send_header('ETag', server.etag)
+            self.end_headers()
+            return
+        body = server.body
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag)
+        self.send_header('Last-Modified', formatdate(server.modified, usegmt=True))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GmServer(http.server.ThreadingHTTPServer):
+    # A local stand-in for Metrics.GM_URL, serving whatever gm was last given to set_gm
+    def __init__(self, gm: list, port: int = 0):
+        super().__init__(('127.0.0.1', port), GmHandler)
+        self.requests = []  # headers of every request so far
+        self.modified = 0
+        self.set_gm(gm)
+
+    def set_gm(self, gm: list):
+        self.body = json.dumps(gm).encode()
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        # Last-Modified has whole seconds, so a gm set within the same second still counts as newer
+        self.modified = max(int(time.time()), self.modified + 1)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/latest.json'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+def check() -> list[str]:
+    # Runs Metrics.update_gms against a GmServer on a synthetic gm and returns what went wrong
+    from metrics import Metrics
+    failures = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_data_dir(work_dir, pokemon=60, moves=60)
+        REGISTRY.configure(work_dir)
+        metrics = Metrics(use_snapshot=False)
+        gm = copy.deepcopy(metrics.gm)
+        move = next(entry for entry in gm if '_MOVE_' in entry['templateId'])
+        move['data']['moveSettings']['power'] += 10
+        server = GmServer(gm)
+        server.start()
+        try:
+            # 200: the gzip body is decoded, applied and replaces the file
+            update = metrics.update_gms(server.url, timeout=10)
+            request = server.requests[-1]
+            if 'gzip' not in request.get('Accept-Encoding', ''):
+                failures.append('200: gzip was not accepted')
+            if 'If-None-Match' in request or 'If-Modified-Since' in request:
+                failures.append('200: the first request was conditional')
+            if update.changed_moves != [move['templateId']]:
+                failures.append(f'200: expected {move["templateId"]} to change, got {update}')
+            with open(metrics.gm_path, 'rb') as gm_file:
+                if json.load(gm_file) != gm:
+                    failures.append('200: the gm file is not the served gm')
+            if metrics._load_gm_meta().get('etag') != server.etag:
+                failures.append('200: the ETag was not stored')
+
+            # 304 on If-None-Match
+            update = metrics.update_gms(server.url, timeout=10)
+            if server.requests[-1].get('If-None-Match') != server.etag:
+                failures.append('304: If-None-Match was not sent')
+            if update:
+                failures.append(f'304: expected no update, got {update}')
+
+            # 304 on If-Modified-Since, when only the Last-Modified was stored
+            meta = metrics._load_gm_meta()
+            meta['etag'] = None
+            with open(metrics._gm_meta_path(), 'w') as meta_file:
+                json.dump(meta, meta_file)
+            update = metrics.update_gms(server.url, timeout=10)
+            if 'If-Modified-Since' not in server.requests[-1]:
+                failures.append('304: If-Modified-Since was not sent')
+            if update:
+                failures.append(f'304: expected no update on If-Modified-Since, got {update}')
+
+            # a new gm on the server is a 200 again
+            move['data']['moveSettings']['power'] += 10
+            server.set_gm(gm)
+            update = metrics.update_gms(server.url, timeout=10)
+            if update.changed_moves != [move['templateId']]:
+                failures.append(f'200 after a change: expected {move["templateId"]} to change, got {update}')
+        finally:
+            server.shutdown()
+            server.server_close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a gm locally with ETag, 304 and gzip like the real gm url')
+    parser.add_argument('--gm', help='gm json to serve, a synthetic one by default')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--check', action='store_true', help='run Metrics.update_gms against it and exit')
+    args = parser.parse_args()
+    if args.check:
+        failures = check()
+        for failure in failures:
+            print('FAIL', failure)
+        print('ok' if not failures else f'{len(failures)} failed')
+        sys.exit(1 if failures else 0)
+    if args.gm:
+        with open(args.gm) as gm_file:
+            gm = json.load(gm_file)
+    else:
+        gm = generate_gm()
+    server = GmServer(gm, args.port)
+    print(f'Serving the gm at {server.url}, pass it to Metrics.update_gms')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
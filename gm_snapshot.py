@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import pickle
+from move import Move
+from pokemon import Pokemon
+
+SNAPSHOT_VERSION = 4
+
+
+def gm_hash(gm_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(gm_path, 'rb') as gm_file:
+        for chunk in iter(lambda: gm_file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def parsed_gm_hash(gm: list) -> str:
+    # for a gm that only exists in memory, e.g. one given to Metrics.apply_gm, so not the same as its file's hash
+    return hashlib.sha256(json.dumps(gm).encode()).hexdigest()
+
+
+def catalog_hash(source_hash: str, overrides: dict, type_table_hash: str) -> str:
+    # The gm's hash combined with the patches the catalog is built with on top of it, and with the type table.
+    # Pickled moves and pokemon keep type ids that depend on that table's order.
+    return hashlib.sha256(
+        (source_hash + json.dumps(overrides, sort_keys=True) + type_table_hash).encode()
+    ).hexdigest()
+
+
+def scores_hash(source_hash: str, cpm_table_hash: str) -> str:
+    # scored results also depend on the cpm table the stats are worked out with, the catalog doesn't
+    return hashlib.sha256((source_hash + cpm_table_hash).encode()).hexdigest()
+
+
+def snapshot_path(gm_path: str, source_hash: str, hidden_power: bool) -> str:
+    root, _ = os.path.splitext(gm_path)
+    return f'{root}.{source_hash[:16]}.{"hp" if hidden_power else "nohp"}.snapshot'
+
+
+def load_snapshot(gm_path: str, source_hash: str, hidden_power: bool) -> tuple[list[Move], list[Pokemon]] | None:
+    path = snapshot_path(gm_path, source_hash, hidden_power)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('gm_hash') != source_hash:
+        return None
+    return snapshot['move_list'], snapshot['pokemon_list']
+
+
+def save_snapshot(
+        gm_path: str,
+        source_hash: str,
+        hidden_power: bool,
+        move_list: list[Move],
+        pokemon_list: list[Pokemon]
+):
+    path = snapshot_path(gm_path, source_hash, hidden_power)
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'gm_hash': source_hash,
+        'hidden_power': hidden_power,
+        'move_list': move_list,  # pickled together so pokemon keep pointing at the same Move objects
+        'pokemon_list': pokemon_list,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as snapshot_file:
+        pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    remove_stale_snapshots(gm_path, source_hash)
+
+
+def remove_stale_snapshots(gm_path: str, source_hash: str):
+    directory = os.path.dirname(gm_path) or '.'
+    prefix = os.path.splitext(os.path.basename(gm_path))[0] + '.'
+    for file_name in os.listdir(directory):
+        if file_name.startswith(prefix) and file_name.endswith('.snapshot'):
+            if file_name[len(prefix):].split('.')[0] != source_hash[:16]:
+                os.remove(os.path.join(directory, file_name))
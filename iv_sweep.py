@@ -0,0 +1,93 @@
+import numpy as np
+from move import Move
+from defender import Defender
+from pokemon import Pokemon
+from pokemon_metrics import PokemonMetrics
+from batch_metrics import BatchMetrics
+
+
+class IVSweep:
+    # Every (atk, def, hp) IV combo at every half level of the cpm table for one attacker, moveset and defender.
+    # Arrays are shaped (len(levels), 4096) and IV combo i is (atk_iv[i], defn_iv[i], hp_iv[i]).
+    METRICS = ['dps', 'tdo', 'er']
+
+    def __init__(
+            self,
+            pokemon: Pokemon,
+            fast_move: Move,
+            charged_move: Move,
+            is_shadow: bool = False,
+            defender: Defender = None,
+    ):
+        self.pokemon = pokemon
+        self.fast_move = fast_move
+        self.charged_move = charged_move
+        self.is_shadow = is_shadow
+        self.defender = defender if defender is not None else Defender()
+
+        self.levels = np.array(PokemonMetrics.levels())
+        cpm = np.array([PokemonMetrics.cpm(level) for level in self.levels])[:, None]
+        ivs = np.arange(16)
+        self.atk_iv, self.defn_iv, self.hp_iv = (iv.ravel() for iv in np.meshgrid(ivs, ivs, ivs, indexing='ij'))
+        atk = (pokemon.base_atk + self.atk_iv) * cpm
+        defn = (pokemon.base_defn + self.defn_iv) * cpm
+        stm = (pokemon.base_stm + self.hp_iv) * cpm
+        # CP doesn't get the shadow bonus
+        self.cp = np.floor(np.maximum(10, atk * np.sqrt(defn * stm) / 10)).astype(int)
+        if is_shadow:
+            atk = atk * PokemonMetrics.SHADOW_POKEMON_BONUS_MULTIPLIER
+            defn = defn * 0.8333333
+
+        batch = BatchMetrics([(pokemon, is_shadow, fast_move, charged_move)])
+        batch.set_stats(atk.ravel(), defn.ravel(), stm.ravel())
+        self.dps, self.tdo, self.er = (metric.reshape(atk.shape) for metric in batch.calculate_metrics(self.defender))
+
+    def metric(self, name: str) -> np.ndarray:
+        if name not in self.METRICS:
+            raise ValueError(f'Unknown metric {name}')
+        return getattr(self, name)
+
+    def iv_index(self, atk_iv: int, defn_iv: int, hp_iv: int) -> int:
+        return atk_iv * 256 + defn_iv * 16 + hp_iv
+
+    def min_level(
+            self,
+            threshold: float,
+            metric: str = 'er',
+            atk_iv: int = None,
+            defn_iv: int = None,
+            hp_iv: int = None
+    ) -> float | None:
+        # lowest level where the metric beats the threshold, with the given IVs or else with any IVs
+        values = self.metric(metric)
+        if None not in (atk_iv, defn_iv, hp_iv):
+            values = values[:, [self.iv_index(atk_iv, defn_iv, hp_iv)]]
+        beats = (values > threshold).any(axis=1)
+        if not beats.any():
+            return None
+        return float(self.levels[np.argmax(beats)])
+
+    def best_ivs(self, cp_cap: int = None, metric: str = 'er', max_level: float = None) -> dict | None:
+        # best IVs and level for the metric with the CP at or under the cap
+        values = np.where(self._allowed(cp_cap, max_level), self.metric(metric), -np.inf)
+        level_index, iv = np.unravel_index(np.argmax(values), values.shape)
+        if values[level_index, iv] == -np.inf:
+            return None
+        return {
+            'level': float(self.levels[level_index]),
+            'atk_iv': int(self.atk_iv[iv]),
+            'defn_iv': int(self.defn_iv[iv]),
+            'hp_iv': int(self.hp_iv[iv]),
+            'cp': int(self.cp[level_index, iv]),
+            'dps': float(self.dps[level_index, iv]),
+            'tdo': float(self.tdo[level_index, iv]),
+            'er': float(self.er[level_index, iv]),
+        }
+
+    def _allowed(self, cp_cap: int = None, max_level: float = None) -> np.ndarray:
+        allowed = np.ones(self.cp.shape, dtype=bool)
+        if cp_cap is not None:
+            allowed &= self.cp <= cp_cap
+        if max_level is not None:
+            allowed &= (self.levels <= max_level)[:, None]
+        return allowed
@@ -1,22 +1,47 @@
+import argparse
+import heapq
 from metrics import Metrics
 from pokemon_metrics import PokemonMetrics
 from defender import Defender
+from result_cache import ResultCache
+from data_registry import REGISTRY, DATA_DIR_ENV
 
 
 def main():
-    metrics = Metrics(hidden_power=False)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', action='store_true', help='print time per phase, counters and cache hit rates')
+    parser.add_argument(
+        '--data-dir', help=f'where the gm, cpm and type tables are, {DATA_DIR_ENV} or data/ next to the code by default'
+    )
+    args = parser.parse_args()
+    if args.data_dir:
+        REGISTRY.configure(args.data_dir)
+    metrics = Metrics(hidden_power=False, result_cache=ResultCache(), profile=args.profile)
     metrics.update_gms()
-    top_x_sorted(metrics.top_attackers_for_type('water', 3))
+    top_x_sorted(metrics.top_attackers_for_type('water', 3, top=100))
+    if args.profile:
+        print_stats(metrics.stats())
 
 
 def top_x_sorted(pkm_list: list[list[PokemonMetrics, float]], amount: int = 100):
-    pkm_list.sort(key=lambda x: x[1], reverse=True)
-    print(f'{" X." : >2} {"pokemon" : <32} | {"fast move" : <22} | {"charge move" : <22} | ER')
-    for i in range(amount):
-        thing = pkm_list[i]
+    # only the best amount are picked out (same order as a stable sort), see exporters.py for whole rankings
+    lines = [f'{" X." : >2} {"pokemon" : <32} | {"fast move" : <22} | {"charge move" : <22} | ER']
+    for i, thing in enumerate(heapq.nlargest(amount, pkm_list, key=lambda x: x[1])):
         fm_name = thing[0].fast_move.name + '^' if thing[0].elite_fast_move else thing[0].fast_move.name
         cm_name = thing[0].charged_move.name + '^' if thing[0].elite_charged_move else thing[0].charged_move.name
-        print(f'{i + 1 : >2}. {thing[0].name : <32} | {fm_name : <22} | {cm_name : <22} | {thing[1]}')
+        lines.append(f'{i + 1 : >2}. {thing[0].name : <32} | {fm_name : <22} | {cm_name : <22} | {thing[1]}')
+    print('\n'.join(lines))
+
+
+def print_stats(stats: dict):
+    print(f'{"phase" : <28} | {"calls" : >8} | seconds')
+    for name, phase in sorted(stats['phases'].items(), key=lambda item: item[1]['seconds'], reverse=True):
+        print(f'{name : <28} | {phase["calls"] : >8} | {phase["seconds"]:.3f}')
+    print(f'{"counter" : <28} | count')
+    for name, count in sorted(stats['counters'].items()):
+        print(f'{name : <28} | {count}')
+    for name, hit_rate in stats['hit_rates'].items():
+        print(f'{name + " hit rate" : <28} | {hit_rate:.1%}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,66 @@
+import numpy as np
+from move import Move
+from pokemon import Pokemon
+
+
+class MatchupCache:
+    # dps/tdo/er of every moveset row against every defender that was scored, kept in memory between queries.
+    # Rows and defenders are keyed by templateId and names so they survive the catalog being rebuilt.
+    # Missing or invalidated scores are NaN.
+
+    def __init__(self):
+        self.columns = {}
+        self.scores = {}
+
+    @staticmethod
+    def row_key(attacker_base: Pokemon, is_shadow: bool, fast_move: Move, charged_move: Move) -> tuple:
+        return attacker_base.tid, attacker_base.name, is_shadow, fast_move.name, charged_move.name
+
+    @staticmethod
+    def defender_key(defender_base: Pokemon) -> tuple:
+        return defender_base.tid, defender_base.name
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _column_ids(self, row_keys: list[tuple]) -> np.ndarray:
+        for key in row_keys:
+            if key not in self.columns:
+                self.columns[key] = len(self.columns)
+        return np.array([self.columns[key] for key in row_keys], dtype=np.intp)
+
+    def _defender_scores(self, defender_key: tuple) -> np.ndarray:
+        scores = self.scores.get(defender_key)
+        if scores is None or scores.shape[1] < len(self.columns):
+            grown = np.full((3, len(self.columns)), np.nan)
+            if scores is not None:
+                grown[:, :scores.shape[1]] = scores
+            self.scores[defender_key] = scores = grown
+        return scores
+
+    def get(self, defender_base: Pokemon, row_keys: list[tuple]) -> np.ndarray:
+        columns = self._column_ids(row_keys)
+        return self._defender_scores(self.defender_key(defender_base))[:, columns]
+
+    def put(self, defender_base: Pokemon, row_keys: list[tuple], scores: np.ndarray):
+        columns = self._column_ids(row_keys)
+        self._defender_scores(self.defender_key(defender_base))[:, columns] = scores
+
+    def invalidate(self, row_keys: list[tuple] = (), defender_keys: list[tuple] = ()) -> int:
+        # forgets the scores of these rows against every defender, and every score of these defenders
+        for key in defender_keys:
+            self.scores.pop(key, None)
+        columns = [self.columns[key] for key in row_keys if key in self.columns]
+        invalidated = 0
+        for scores in self.scores.values():
+            known = [column for column in columns if column < scores.shape[1]]
+            invalidated += int(np.count_nonzero(~np.isnan(scores[0, known])))
+            scores[:, known] = np.nan
+        return invalidated
+
+    def defender_keys(self) -> list[tuple]:
+        return list(self.scores)
+
+    def clear(self):
+        self.columns.clear()
+        self.scores.clear()
@@ -1,39 +1,61 @@
 import json
+import os
+import tempfile
 import requests
 import re
-import copy
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from move import Move
 from defender import Defender
 from pokemon import Pokemon
 from pokemon_metrics import PokemonMetrics
+from batch_metrics import BatchMetrics
+from catalog import Catalog
+import type_chart
+from data_registry import REGISTRY, RegistryTable
+from gm_snapshot import gm_hash, parsed_gm_hash, catalog_hash, scores_hash, load_snapshot, save_snapshot
+from parallel import init_worker, score_defenders
+from results import ResultColumns
+from result_cache import ResultCache
+from matchup_cache import MatchupCache
+from gm_diff import GmUpdate, diff_gms
+from counter_matrix import CounterMatrix, counter_matrix_path, remove_stale_counter_matrices
+from profiling import PROFILER
+from raid_simulator import RaidSimulator
 
 
-def _is_different(first, second, tid):
-    current = first['pokemonSettings']
-    previous = second['pokemonSettings']
-    if current['stats'] != previous['stats']:
-        return True
-    elif current['quickMoves'] != previous['quickMoves']:
-        return True
-    elif current['cinematicMoves'] != previous['cinematicMoves']:
-        return True
-    elif current['type'] != previous['type']:
-        return True
-    elif 'type2' in current and 'type2' in previous:
-        if current['type2'] != previous['type2']:
-            return True
-    try:
-        if 'eliteCinematicMove' in current or 'eliteCinematicMove' in previous:
-            if current['eliteCinematicMove'] != previous['eliteCinematicMove']:
-                return True
-        if 'eliteQuickMove' in current or 'eliteQuickMove' in previous:
-            if current['eliteQuickMove'] != previous['eliteQuickMove']:
-                return True
-    except KeyError:
-        return True
-    if tid in ['V0250_POKEMON_HO_OH_S', 'V0249_POKEMON_LUGIA_S']:
-        return True
-    return False
+def _fingerprint(entry: dict) -> tuple[str, str | None]:
+    # Two forms are the same when their stats, moves, types and elite moves match. type2 only counts when
+    # both forms have one, so it's kept next to the fingerprint instead of in it
+    settings = entry['pokemonSettings']
+    fingerprint = json.dumps([
+        settings.get('stats'),
+        settings.get('quickMoves'),
+        settings.get('cinematicMoves'),
+        settings.get('type'),
+        'eliteCinematicMove' in settings,
+        settings.get('eliteCinematicMove'),
+        'eliteQuickMove' in settings,
+        settings.get('eliteQuickMove'),
+    ], sort_keys=True)
+    return fingerprint, settings.get('type2')
+
+
+class RunningMetrics:
+    def __init__(self, first: int):
+        self.first = first  # row of the moveset, see Metrics._moveset_rows
+        self.sums = [0, 0, 0]
+        self.count = 0
+
+    def add(self, dps: float, tdo: float, er: float):
+        self.sums[0] += dps
+        self.sums[1] += tdo
+        self.sums[2] += er
+        self.count += 1
+
+    def averages(self) -> list[float]:
+        return [x / self.count for x in self.sums]
 
 
 class Metrics:
@@ -57,7 +79,7 @@ class Metrics:
         'normal',
         'fairy'
     ]
-    TYPE_DICT = json.load(open('./data/type_effectiveness.json'))
+    TYPE_DICT = RegistryTable('type_effectiveness')
     _tids_to_exclude = [
         'V0051_POKEMON_DUGTRIO',
         'V0351_POKEMON_CASTFORM',
@@ -72,6 +94,14 @@ class Metrics:
         'V0680_POKEMON_DOUBLADE': {'stats': {'baseStamina': 153, 'baseAttack': 188, 'baseDefense': 206}},
         'V0681_POKEMON_AEGISLASH': {'stats': {'baseStamina': 155, 'baseAttack': 97, 'baseDefense': 291}}
     }
+    _extra_moves = {  # moves that will come to starters, added to the pokemon with these names when they're built
+        'meowscarada': {'elite_charged_moves': ['frenzy plant']},
+        'rillaboom': {'elite_charged_moves': ['frenzy plant']},
+        'skeledirge': {'elite_charged_moves': ['blast burn']},
+        'cinderace': {'elite_charged_moves': ['blast burn']},
+        'quaquaval': {'elite_charged_moves': ['hydro cannon']},
+        'inteleon': {'elite_charged_moves': ['hydro cannon']},
+    }
     _moves_without_names = {
         387: 'geomancy',
         389: 'oblivion wing',
@@ -148,17 +178,75 @@ class Metrics:
         'V0720_POKEMON_HOOPA_UNBOUND',
     ]
 
-    def __init__(self, hidden_power: bool = True):
-        self.gm = json.load(open('./data/pokeminers_gm.json'))
+    GM_URL = 'https://raw.githubusercontent.com/PokeMiners/game_masters/master/latest/latest.json'
+
+    def __init__(
+            self,
+            hidden_power: bool = True,
+            use_snapshot: bool = True,
+            result_cache: ResultCache = None,
+            matchup_cache: MatchupCache = None,
+            profile: bool = False,
+            gm_path: str = None
+    ):
+        self.profiler = PROFILER  # shared by every Metrics, see stats
+        if profile:
+            self.profiler.enable()
+        self._gm = None
+        self.gm_path = gm_path or REGISTRY.gm_path
+        self.include_hidden_power = hidden_power
+        self.use_snapshot = use_snapshot
+        self.result_cache = result_cache
+        self.matchup_cache = matchup_cache
+        self.counter_matrix = None
+        self.load_catalog()
+
+    @property
+    def gm(self):
+        if self._gm is None:  # only parsed when the snapshot is missing or the raw gm is asked for
+            with self.profiler.phase('gm_load'):
+                self._gm = REGISTRY.gm(self.gm_path)
+        return self._gm
+
+    @gm.setter
+    def gm(self, value):
+        self._gm = value
+
+    def stats(self) -> dict:
+        # Wall time and calls per phase, counters and cache hit rates since the profiler was enabled or reset.
+        # Only filled in with Metrics(profile=True), work done in process pool workers isn't counted.
+        stats = self.profiler.snapshot()
+        stats['intake_cache_size'] = len(PokemonMetrics._intake_cache)
+        return stats
+
+    def load_catalog(self):
+        with self.profiler.phase('load_catalog'):
+            self._load_catalog()
+
+    def _load_catalog(self):
+        source_hash = self._catalog_hash(gm_hash(self.gm_path))
+        self.gm_hash = source_hash
+        if self.result_cache is not None:
+            self.result_cache.invalidate(self.scores_hash)  # results from any other gm or tables are stale now
+        snapshot = load_snapshot(self.gm_path, source_hash, self.include_hidden_power) if self.use_snapshot else None
+        if self.use_snapshot:
+            self.profiler.count('snapshot_misses' if snapshot is None else 'snapshot_hits')
+        if snapshot is not None:
+            self.move_list, self.pokemon_list = snapshot
+            self.catalog = Catalog(self.move_list, self.pokemon_list)
+            self._intern_hidden_power()
+            return
         self.move_list = self.get_list_of_moves()
-        self.pokemon_list = self.get_list_of_pokemon(hidden_power=hidden_power)
+        self.catalog = Catalog(self.move_list)  # get_list_of_pokemon looks moves up through the catalog
+        self.pokemon_list = self.get_list_of_pokemon(hidden_power=self.include_hidden_power)
+        self.catalog.add_pokemon(self.pokemon_list)
+        if self.use_snapshot:
+            save_snapshot(self.gm_path, source_hash, self.include_hidden_power, self.move_list, self.pokemon_list)
 
     def most_effective_types(self, pokemon: Pokemon) -> list[list[str]]:
         eff_list = {}
         for typing in self.TYPES:
-            current_eff_against_mon = self.TYPE_DICT[typing][pokemon.type_1]
-            if pokemon.type_2 != '':
-                current_eff_against_mon *= self.TYPE_DICT[typing][pokemon.type_2]
+            current_eff_against_mon = type_chart.DUAL_TYPE_ROWS[type_chart.TYPE_IDS[typing]][pokemon.dual_type_id]
             if current_eff_against_mon not in eff_list:
                 eff_list[current_eff_against_mon] = [typing]
             else:
@@ -173,101 +261,568 @@ class Metrics:
             include_mega: bool = True,
             include_ultra_beast: bool = True,
     ) -> list[Pokemon]:
-        top_effective = []
-        for pokemon in self.pokemon_list:
-            if pokemon.mythical and not include_mythical:
-                continue
-            if pokemon.is_mega and not include_mega:
-                continue
-            if pokemon.ultra_beast and not include_ultra_beast:
-                continue
-            if pokemon.legendary and not include_legendary:
+        return self.get_lists_of_raid_weak_to(
+            [typing], include_legendary, include_mythical, include_mega, include_ultra_beast
+        )[typing]
+
+    def get_lists_of_raid_weak_to(
+            self,
+            types: list[str],
+            include_legendary: bool = True,
+            include_mythical: bool = True,
+            include_mega: bool = True,
+            include_ultra_beast: bool = True,
+    ) -> dict[str, list[Pokemon]]:
+        # get_list_of_raid_weak_to for several types with a single pass over the raid bosses
+        included = [include_legendary, include_mythical, include_mega, include_ultra_beast]
+        excluded = {
+            id(pokemon)
+            for pokemon_class, include in zip(Catalog.CLASSES, included) if not include
+            for pokemon in self.catalog.pokemon_by_class[pokemon_class]
+        }
+        not_in_raids = set(self._released_non_raid_ubl + self._unreleased_ubl)
+        released_raid_m = set(self._released_raid_m)
+        eff_by_type_pair = {}
+        top_effective = {typing: [] for typing in types}
+        for pokemon in self.catalog.pokemon_of_classes(Catalog.CLASSES):
+            if id(pokemon) in excluded or pokemon.tid in not_in_raids:
                 continue
-            if pokemon.mythical or pokemon.legendary or pokemon.ultra_beast or pokemon.is_mega:
-                if pokemon.tid not in self._released_non_raid_ubl and pokemon.tid not in self._unreleased_ubl:
-                    if not pokemon.mythical or pokemon.tid in self._released_raid_m:
-                        eff_types = self.most_effective_types(pokemon)
-                        if typing in eff_types[0] or typing is None:
-                            top_effective.append(pokemon)
+            if not pokemon.mythical or pokemon.tid in released_raid_m:
+                type_pair = (pokemon.type_1, pokemon.type_2)
+                if type_pair not in eff_by_type_pair:
+                    eff_by_type_pair[type_pair] = self.most_effective_types(pokemon)
+                for typing in types:
+                    if typing in eff_by_type_pair[type_pair][0] or typing is None:
+                        top_effective[typing].append(pokemon)
         return top_effective
 
-    def top_attackers_for_type(self, typing: str, sort_by: int = 1):
-        for mon in self.pokemon_list:  # Adding moves that will come to starters
-            if mon.name in ['meowscarada', 'rillaboom']:
-                mon.elite_charged_moves.append(self.get_move_by_name('frenzy plant'))
-            elif mon.name in ['skeledirge', 'cinderace']:
-                mon.elite_charged_moves.append(self.get_move_by_name('blast burn'))
-            elif mon.name in ['quaquaval', 'inteleon']:
-                mon.elite_charged_moves.append(self.get_move_by_name('hydro cannon'))
-        all_metrics = {}
-        for defender_base in self.get_list_of_raid_weak_to(typing):
+    def movesets(self, attacker_base: Pokemon):
+        for is_shadow in [True, False]:
+            for fast_move in attacker_base.fast_moves + attacker_base.elite_fast_moves:
+                for charged_move in attacker_base.charged_moves + attacker_base.elite_charged_moves:
+                    purified_only_moves = ['return', 'sacred fire plus plus', 'aeroblast plus plus']
+                    if charged_move.name in purified_only_moves and is_shadow:
+                        continue
+                    if charged_move.name in ['sacred fire plus', 'aeroblast plus'] and not is_shadow:
+                        continue
+                    if attacker_base.is_mega and is_shadow:
+                        continue
+                    yield is_shadow, fast_move, charged_move
+
+    def top_attackers_for_type(
+            self,
+            typing: str,
+            sort_by: int = 1,
+            backend: str = 'python',
+            workers: int = 1,
+            columnar: bool = False,
+            top: int = None
+    ):
+        # With top only the best top attackers are returned, sorted, and movesets that can't make it aren't scored
+        with self.profiler.phase('top_attackers_for_type'):
+            return self._top_attackers_for_type(typing, sort_by, backend, workers, columnar, top)
+
+    def _top_attackers_for_type(
+            self,
+            typing: str,
+            sort_by: int,
+            backend: str,
+            workers: int,
+            columnar: bool,
+            top: int
+    ):
+        if backend not in ['python', 'numpy', 'matrix', 'simulate']:
+            raise ValueError(f'Unknown backend {backend}')
+        defenders = self.get_list_of_raid_weak_to(typing)
+        if not defenders:
+            return ResultColumns() if columnar else []
+        cache_key = None
+        cached = None
+        if self.result_cache is not None:
+            cache_key = self._result_cache_key(typing, sort_by, top, simulated=backend == 'simulate')
+            cached = self.result_cache.get(cache_key)
+            self.profiler.count('result_cache_misses' if cached is None else 'result_cache_hits')
+        if cached is not None:
+            rows, winners = self._load_winners(cached)
+        elif backend == 'simulate':
+            rows, winners = self._top_attackers_simulated(defenders, sort_by, top)
+        elif top is not None:
+            rows, winners = self._top_attackers_pruned(defenders, sort_by, backend, top)
+        elif backend == 'matrix':
+            rows, winners = self._top_attackers_matrix(defenders, sort_by)
+        elif workers > 1:
+            rows, winners = self._top_attackers_parallel(defenders, sort_by, backend, workers)
+        elif backend == 'numpy':
+            rows, winners = self._top_attackers_batch(defenders, sort_by)
+        else:
+            rows, winners = self._top_attackers_python(defenders, sort_by)
+        if cache_key is not None and cached is None:
+            self.result_cache.put(cache_key, self._dump_winners(rows, winners))
+        if columnar:
+            return self._result_columns(winners, rows)
+        return self._first_results(winners, rows, defenders[0], sort_by)
+
+    def top_attackers_for_types(
+            self,
+            types: list[str] = None,
+            sort_by: int = 1,
+            backend: str = 'numpy',
+            columnar: bool = False,
+            top: int = None
+    ) -> dict:
+        # top_attackers_for_type for several types (all of TYPES by default) at once. Every boss is scored once
+        # however many of the types it is weak to, then each type's averages are summed from those scores.
+        # Results are the same as top_attackers_for_type's, and share its result cache entries.
+        with self.profiler.phase('top_attackers_for_types'):
+            return self._top_attackers_for_types(types, sort_by, backend, columnar, top)
+
+    def _top_attackers_for_types(self, types: list[str], sort_by: int, backend: str, columnar: bool, top: int) -> dict:
+        types = self.TYPES if types is None else types
+        if backend not in ['numpy', 'matrix']:
+            raise ValueError(f'Unknown backend {backend}')
+        defenders_by_type = self.get_lists_of_raid_weak_to(types)
+        results = {}
+        pending = []
+        for typing in types:
+            cached = None
+            if self.result_cache is not None and defenders_by_type[typing]:
+                cached = self.result_cache.get(self._result_cache_key(typing, sort_by, top))
+                self.profiler.count('result_cache_misses' if cached is None else 'result_cache_hits')
+            if cached is not None:
+                results[typing] = self._load_winners(cached)
+            elif defenders_by_type[typing]:
+                pending.append(typing)
+
+        if pending:
+            rows, keys = self._moveset_rows(unique=True)
+            row_keys = [MatchupCache.row_key(*row) for row in rows]
+            bosses = {}  # every boss of the pending types, in the order they first show up
+            for typing in pending:
+                for defender_base in defenders_by_type[typing]:
+                    bosses.setdefault(id(defender_base), defender_base)
+            if backend == 'matrix':
+                matrix = self._covering_counter_matrix(rows, list(bosses.values()))
+                scores = {
+                    key: matrix.boss_scores(MatchupCache.defender_key(defender_base), row_keys)
+                    for key, defender_base in bosses.items()
+                }
+            else:
+                batch = BatchMetrics(rows)
+                scores = {}
+                for key, defender_base in bosses.items():
+                    print(f'Calculating Metrics for all pokemon against {defender_base.name}...')
+                    scores[key] = self._score_defender(defender_base, rows, batch, row_keys)
+            for typing in pending:
+                totals = np.zeros((3, len(rows)))
+                for defender_base in defenders_by_type[typing]:  # same order as the single type backends
+                    totals += scores[id(defender_base)]
+                averages = (totals / len(defenders_by_type[typing])).T.tolist()
+                winners = self._best_movesets(
+                    (
+                        (attacker_base, pid.startswith('True'), averages[row], row)
+                        for row, (attacker_base, pid) in enumerate(keys)
+                    ),
+                    sort_by
+                )
+                if top is not None:  # ranked like _top_attackers_pruned, ties keep catalog order
+                    winners = sorted(winners, key=lambda winner: -winner[1][sort_by - 1])[:top]
+                if self.result_cache is not None:
+                    cache_key = self._result_cache_key(typing, sort_by, top)
+                    self.result_cache.put(cache_key, self._dump_winners(rows, winners))
+                results[typing] = rows, winners
+
+        ranked = {}
+        for typing in types:
+            if typing not in results:
+                ranked[typing] = ResultColumns() if columnar else []
+                continue
+            rows, winners = results[typing]
+            if columnar:
+                ranked[typing] = self._result_columns(winners, rows)
+            else:
+                ranked[typing] = self._first_results(winners, rows, defenders_by_type[typing][0], sort_by)
+        return ranked
+
+    def _result_cache_key(self, typing: str, sort_by: int, top: int = None, simulated: bool = False) -> str:
+        return self.result_cache.key(
+            self.scores_hash,
+            hidden_power=self.include_hidden_power,
+            typing=typing,
+            sort_by=sort_by,
+            defender_dps=Defender.dps,
+            top=top,
+            simulated=simulated
+        )
+
+    def _top_attackers_python(self, defenders: list[Pokemon], sort_by: int = 1):
+        rows, keys = self._moveset_rows()
+        running = {}
+        for defender_base in defenders:
             print(f'Calculating Metrics for all pokemon against {defender_base.name}...')
-            for attacker_base in self.pokemon_list:
-                for is_shadow in [True, False]:
-                    for fast_move in attacker_base.fast_moves + attacker_base.elite_fast_moves:
-                        for charged_move in attacker_base.charged_moves + attacker_base.elite_charged_moves:
-                            purified_only_moves = ['return', 'sacred fire plus plus', 'aeroblast plus plus']
-                            if charged_move.name in purified_only_moves and is_shadow:
-                                continue
-                            if charged_move.name in ['sacred fire plus', 'aeroblast plus'] and not is_shadow:
-                                continue
-                            if attacker_base.is_mega and is_shadow:
-                                continue
-                            attacker = PokemonMetrics(
-                                attacker_base,
-                                fast_move,
-                                charged_move,
-                                is_shadow=is_shadow,
-                                defender=Defender(defender_mon=defender_base)
-                            )
-                            if charged_move in attacker_base.elite_charged_moves:
-                                attacker.elite_charged_move = True
-                            if fast_move in attacker_base.elite_fast_moves:
-                                attacker.elite_fast_move = True
-                            pid = str(is_shadow) + fast_move.name + charged_move.name
-                            if attacker_base not in all_metrics:
-                                all_metrics[attacker_base] = {pid: [attacker]}
-                            else:
-                                if pid not in all_metrics[attacker_base]:
-                                    all_metrics[attacker_base][pid] = [attacker]
-                                else:
-                                    all_metrics[attacker_base][pid].append(attacker)
+            with self.profiler.phase('score_defender'):
+                for row, (attacker_base, is_shadow, fast_move, charged_move) in enumerate(rows):
+                    attacker = PokemonMetrics(
+                        attacker_base,
+                        fast_move,
+                        charged_move,
+                        is_shadow=is_shadow,
+                        defender=Defender(defender_mon=defender_base)
+                    )
+                    if keys[row] not in running:  # the rows are summed as they come, no matchup is kept
+                        running[keys[row]] = RunningMetrics(row)
+                    running[keys[row]].add(attacker.dps, attacker.tdo, attacker.er)
+        return rows, self._best_movesets(
+            ((attacker_base, pid.startswith('True'), entry.averages(), entry.first)
+             for (attacker_base, pid), entry in running.items()),
+            sort_by
+        )
+
+    @staticmethod
+    def _best_movesets(candidates, sort_by: int = 1) -> list[tuple[int, list[float]]]:
+        # candidates are (attacker_base, is_shadow, averages, row) in moveset order, the first highest average wins
+        best = {}
+        for attacker_base, is_shadow, averages, row in candidates:
+            key = (attacker_base, is_shadow)
+            if averages[sort_by - 1] > (best[key][1][sort_by - 1] if key in best else 0):
+                best[key] = (row, averages)
+        return list(best.values())
+
+    def _top_attackers_simulated(self, defenders: list[Pokemon], sort_by: int = 1, top: int = None):
+        # Like the numpy backend but every matchup is played out by RaidSimulator. The pruning bounds of top
+        # only hold for the closed form, so with top every moveset is still simulated and the ranking is cut after.
+        rows, keys = self._moveset_rows(unique=True)
+        simulator = RaidSimulator(rows)
+        totals = np.zeros((3, len(simulator)))
+        for defender_base in defenders:
+            print(f'Simulating all pokemon against {defender_base.name}...')
+            with self.profiler.phase('simulate_defender'):
+                totals += np.array(simulator.calculate_metrics(Defender(defender_mon=defender_base)))
+        averages = (totals / len(defenders)).T.tolist()
+        winners = self._best_movesets(
+            (
+                (attacker_base, pid.startswith('True'), averages[row], row)
+                for row, (attacker_base, pid) in enumerate(keys)
+            ),
+            sort_by
+        )
+        if top is not None:
+            winners = sorted(winners, key=lambda winner: -winner[1][sort_by - 1])[:top]
+        return rows, winners
+
+    def _moveset_rows(self, unique: bool = False):
+        rows = []
+        keys = []
+        seen = set()
+        for attacker_base in self.pokemon_list:
+            for is_shadow, fast_move, charged_move in self.movesets(attacker_base):
+                key = (attacker_base, str(is_shadow) + fast_move.name + charged_move.name)
+                if unique and key in seen:  # repeated moves give the same numbers, only keep the first
+                    continue
+                seen.add(key)
+                rows.append((attacker_base, is_shadow, fast_move, charged_move))
+                keys.append(key)
+        return rows, keys
+
+    def _dump_winners(self, rows: list, winners: list) -> list[tuple]:
+        # Pokemon by catalog position and moves by name so a cached result maps back onto this catalog's objects
+        dumped = []
+        for row, averages in winners:
+            attacker_base, is_shadow, fast_move, charged_move = rows[row]
+            position = self.catalog.positions[id(attacker_base)]
+            dumped.append((position, is_shadow, fast_move.name, charged_move.name, averages))
+        return dumped
+
+    def _load_winners(self, dumped: list[tuple]):
+        rows = []
+        winners = []
+        for position, is_shadow, fast_name, charged_name, averages in dumped:
+            attacker_base = self.pokemon_list[position]
+            fast_move = next(
+                m for m in attacker_base.fast_moves + attacker_base.elite_fast_moves if m.name == fast_name
+            )
+            charged_move = next(
+                m for m in attacker_base.charged_moves + attacker_base.elite_charged_moves if m.name == charged_name
+            )
+            winners.append((len(rows), averages))
+            rows.append((attacker_base, is_shadow, fast_move, charged_move))
+        return rows, winners
+
+    @staticmethod
+    def _first_results(winners: list, rows: list, defender_base: Pokemon, sort_by: int = 1) -> list[list]:
+        # [PokemonMetrics of the first matchup, average] for every winner, the list top_attackers_for_type returns
         top_average = []
-        for base_pokemon in all_metrics:
-            highest_average_shadow = None
-            highest_metric_shadow = 0
-            highest_average = None
-            highest_metric = 0
-            for entry in all_metrics[base_pokemon]:
-                metric_sum = [0, 0, 0]
-                results = all_metrics[base_pokemon][entry]
-                for metric in results:
-                    metric_sum[0] += metric.dps
-                    metric_sum[1] += metric.tdo
-                    metric_sum[2] += metric.er
-                metric_sum = [x / len(results) for x in metric_sum]
-                if entry.startswith('False'):
-                    if metric_sum[sort_by - 1] > highest_metric:
-                        highest_metric = metric_sum[sort_by - 1]
-                        highest_average = results[0]
-                if entry.startswith('True'):
-                    if metric_sum[sort_by - 1] > highest_metric_shadow:
-                        highest_metric_shadow = metric_sum[sort_by - 1]
-                        highest_average_shadow = results[0]
-            if highest_average_shadow is not None:
-                top_average.append([highest_average_shadow, highest_metric_shadow])
-            if highest_average is not None:
-                top_average.append([highest_average, highest_metric])
+        for row, averages in winners:
+            attacker_base, is_shadow, fast_move, charged_move = rows[row]
+            attacker = PokemonMetrics(
+                attacker_base,
+                fast_move,
+                charged_move,
+                is_shadow=is_shadow,
+                defender=Defender(defender_mon=defender_base)
+            )
+            attacker.elite_charged_move = charged_move in attacker_base.elite_charged_moves
+            attacker.elite_fast_move = fast_move in attacker_base.elite_fast_moves
+            top_average.append([attacker, averages[sort_by - 1]])
         return top_average
 
+    @staticmethod
+    def _result_columns(winners: list, rows: list) -> ResultColumns:
+        columns = ResultColumns()
+        for row, averages in winners:
+            attacker_base, is_shadow, fast_move, charged_move = rows[row]
+            columns.append(
+                attacker_base,
+                fast_move,
+                charged_move,
+                is_shadow,
+                fast_move in attacker_base.elite_fast_moves,
+                charged_move in attacker_base.elite_charged_moves,
+                *averages
+            )
+        return columns
+
+    def _top_attackers_batch(self, defenders: list[Pokemon], sort_by: int = 1):
+        # Same averaging and selection as the python backend, but each defender is one vectorized BatchMetrics call
+        rows, keys = self._moveset_rows(unique=True)
+        batch = BatchMetrics(rows)
+        totals = np.zeros((3, len(batch)))
+        row_keys = [MatchupCache.row_key(*row) for row in rows] if self.matchup_cache is not None else None
+        for defender_base in defenders:
+            print(f'Calculating Metrics for all pokemon against {defender_base.name}...')
+            totals += self._score_defender(defender_base, rows, batch, row_keys)
+        averages = (totals / len(defenders)).T.tolist()
+        return rows, self._best_movesets(
+            (
+                (attacker_base, pid.startswith('True'), averages[row], row)
+                for row, (attacker_base, pid) in enumerate(keys)
+            ),
+            sort_by
+        )
+
+    def _top_attackers_pruned(self, defenders: list[Pokemon], sort_by: int, backend: str, top: int):
+        # Every moveset gets an upper bound on its average: dps can't beat the better of its fast and charged
+        # move's dps, and tdo/er follow from that with the real y, which only depends on the attacker's types
+        # and defense so it's worked out once per (attacker, is_shadow). Movesets are scored from the highest
+        # bound down until the next bound is under the top-th best attacker, so the result is the same as the
+        # exhaustive backends' sorted and cut to top.
+        rows, keys = self._moveset_rows(unique=True)
+        if not rows:
+            return rows, []
+        repeats = Counter(self._moveset_rows()[1])  # the python backend sums repeated moves once per repeat
+        groups = {}  # (attacker, is_shadow) like _best_movesets, numbered in the order they first show up
+        first_rows = []
+        group_of_row = []
+        for row, (attacker_base, is_shadow, _, _) in enumerate(rows):
+            if (attacker_base, is_shadow) not in groups:
+                groups[(attacker_base, is_shadow)] = len(first_rows)
+                first_rows.append(row)
+            group_of_row.append(groups[(attacker_base, is_shadow)])
+        group_of_row = np.array(group_of_row, dtype=np.intp)
+        batch = BatchMetrics(rows)
+        group_batch = BatchMetrics([rows[row] for row in first_rows])
+        bounds = np.zeros(len(rows))
+        for defender_base in defenders:
+            defender = Defender(defender_mon=defender_base)
+            bound = batch.dps_bound(defender)
+            if sort_by != 1:
+                survival_time = batch.stm / group_batch.intake_y(defender)[group_of_row]
+                bound = bound * (survival_time if sort_by == 2 else survival_time ** 0.25)
+            bounds += bound
+        bounds = bounds / len(defenders) * (1 + 1e-9)  # room for the rounding of the real averages
+
+        order = np.argsort(-bounds, kind='stable')
+        best = {}  # group -> (average, row, averages) of its best moveset scored so far
+        chunk_size = max(top, 32)
+        start = 0
+        scored = 0
+        while start < len(order):
+            if len(best) >= top:
+                threshold = sorted((average for average, _, _ in best.values()), reverse=True)[top - 1]
+                chunk = order[start:start + chunk_size]
+                chunk = chunk[bounds[chunk] >= threshold]
+                if len(chunk) == 0:
+                    break
+            else:
+                chunk = order[start:start + chunk_size]
+            start += chunk_size
+            scored += len(chunk)
+            chunk = np.sort(chunk)
+            averages = self._moveset_averages(
+                [rows[row] for row in chunk], defenders, backend, [repeats[keys[row]] for row in chunk]
+            )
+            for row, row_averages in zip(chunk.tolist(), averages):
+                group = group_of_row[row]
+                average = row_averages[sort_by - 1]
+                if (
+                        group not in best or average > best[group][0]
+                        or (average == best[group][0] and row < best[group][1])
+                ):
+                    best[group] = (average, row, row_averages)
+        self.profiler.count('top_k_scored_movesets', scored)
+        self.profiler.count('top_k_skipped_movesets', len(order) - scored)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))[:top]
+        return rows, [(row, row_averages) for _, (_, row, row_averages) in ranked]
+
+    def _moveset_averages(
+            self, rows: list, defenders: list[Pokemon], backend: str, repeats: list[int]
+    ) -> list[list[float]]:
+        # averages over the defenders summed in the same order as the exhaustive backends, so they match exactly
+        if backend == 'matrix':
+            return self._covering_counter_matrix(rows, defenders).averages(
+                [MatchupCache.defender_key(defender_base) for defender_base in defenders],
+                [MatchupCache.row_key(*row) for row in rows]
+            ).T.tolist()
+        if backend == 'numpy':
+            batch = BatchMetrics(rows)
+            row_keys = [MatchupCache.row_key(*row) for row in rows] if self.matchup_cache is not None else None
+            totals = np.zeros((3, len(rows)))
+            for defender_base in defenders:
+                totals += self._score_defender(defender_base, rows, batch, row_keys)
+            return (totals / len(defenders)).T.tolist()
+        running = [RunningMetrics(row) for row in range(len(rows))]
+        for defender_base in defenders:
+            with self.profiler.phase('score_defender'):
+                for row, (attacker_base, is_shadow, fast_move, charged_move) in enumerate(rows):
+                    attacker = PokemonMetrics(
+                        attacker_base,
+                        fast_move,
+                        charged_move,
+                        is_shadow=is_shadow,
+                        defender=Defender(defender_mon=defender_base)
+                    )
+                    for _ in range(repeats[row]):
+                        running[row].add(attacker.dps, attacker.tdo, attacker.er)
+        return [entry.averages() for entry in running]
+
+    def top_attackers_against(self, bosses: list[Pokemon], sort_by: int = 1, columnar: bool = False):
+        # top_attackers_for_type for any set of bosses, e.g. a single one, reduced from the counter matrix
+        if not bosses:
+            return ResultColumns() if columnar else []
+        rows, winners = self._top_attackers_matrix(bosses, sort_by)
+        if columnar:
+            return self._result_columns(winners, rows)
+        return self._first_results(winners, rows, bosses[0], sort_by)
+
+    def movesets_for_type(self, typing: str, backend: str = 'numpy') -> ResultColumns:
+        # Every moveset with its averages against the raid bosses weak to typing, not just each attacker's best.
+        # Unsorted, in moveset order, see the exporters for ranking them.
+        if backend not in ['python', 'numpy', 'matrix']:
+            raise ValueError(f'Unknown backend {backend}')
+        defenders = self.get_list_of_raid_weak_to(typing)
+        if not defenders:
+            return ResultColumns()
+        rows, _ = self._moveset_rows(unique=True)
+        with self.profiler.phase('movesets_for_type'):
+            averages = self._moveset_averages(rows, defenders, backend, [1] * len(rows))
+        return self._result_columns(list(enumerate(averages)), rows)
+
+    def covering_counter_matrix(self, bosses: list[Pokemon]) -> CounterMatrix:
+        # the counter matrix with every moveset against these bosses, built again if the stored one doesn't have them
+        rows, _ = self._moveset_rows(unique=True)
+        return self._covering_counter_matrix(rows, bosses)
+
+    def _top_attackers_matrix(self, defenders: list[Pokemon], sort_by: int = 1):
+        rows, keys = self._moveset_rows(unique=True)
+        matrix = self._covering_counter_matrix(rows, defenders)
+        averages = matrix.averages(
+            [MatchupCache.defender_key(defender_base) for defender_base in defenders],
+            [MatchupCache.row_key(*row) for row in rows]
+        ).T.tolist()
+        return rows, self._best_movesets(
+            (
+                (attacker_base, pid.startswith('True'), averages[row], row)
+                for row, (attacker_base, pid) in enumerate(keys)
+            ),
+            sort_by
+        )
+
+    def build_counter_matrix(self, bosses: list[Pokemon] = None) -> CounterMatrix:
+        # Scores every moveset against every raid boss (and any other bosses given) once and maps the result
+        # from disk, see CounterMatrix. Done again by _covering_counter_matrix when the gm or the movesets change.
+        rows, _ = self._moveset_rows(unique=True)
+        raid_bosses = self.get_list_of_raid_weak_to()
+        boss_keys = {MatchupCache.defender_key(boss) for boss in raid_bosses}
+        raid_bosses += [boss for boss in bosses or [] if MatchupCache.defender_key(boss) not in boss_keys]
+        row_keys = [MatchupCache.row_key(*row) for row in rows]
+        batch = BatchMetrics(rows)
+        self.counter_matrix = CounterMatrix.build(
+            counter_matrix_path(self.gm_path, self.scores_hash, self.include_hidden_power),
+            row_keys,
+            [MatchupCache.defender_key(boss) for boss in raid_bosses],
+            lambda index: self._score_defender(raid_bosses[index], rows, batch, row_keys)
+        )
+        remove_stale_counter_matrices(self.gm_path, self.scores_hash)
+        return self.counter_matrix
+
+    def _covering_counter_matrix(self, rows: list, bosses: list[Pokemon]) -> CounterMatrix:
+        path = counter_matrix_path(self.gm_path, self.scores_hash, self.include_hidden_power)
+        if self.counter_matrix is None or self.counter_matrix.path != path:
+            self.counter_matrix = CounterMatrix.load(path)
+        row_keys = [MatchupCache.row_key(*row) for row in rows]
+        boss_keys = [MatchupCache.defender_key(boss) for boss in bosses]
+        if self.counter_matrix is None or not self.counter_matrix.covers(row_keys, boss_keys):
+            self.build_counter_matrix(bosses)
+        return self.counter_matrix
+
+    def _score_defender(self, defender_base: Pokemon, rows: list, batch: BatchMetrics, row_keys: list = None):
+        with self.profiler.phase('score_defender'):
+            return self._score_defender_rows(defender_base, rows, batch, row_keys)
+
+    def _score_defender_rows(self, defender_base: Pokemon, rows: list, batch: BatchMetrics, row_keys: list = None):
+        if self.matchup_cache is None:
+            return np.array(batch.calculate_metrics(Defender(defender_mon=defender_base)))
+        scores = self.matchup_cache.get(defender_base, row_keys)
+        missing = np.isnan(scores[0])
+        self.profiler.count('matchup_cache_misses', int(np.count_nonzero(missing)))
+        self.profiler.count('matchup_cache_hits', int(len(missing) - np.count_nonzero(missing)))
+        if missing.all():
+            scores = np.array(batch.calculate_metrics(Defender(defender_mon=defender_base)))
+        elif missing.any():  # only the rows that aren't cached yet, or were invalidated by apply_gm
+            missing_rows = BatchMetrics([rows[row] for row in np.flatnonzero(missing)])
+            scores[:, missing] = missing_rows.calculate_metrics(Defender(defender_mon=defender_base))
+        if missing.any():
+            self.matchup_cache.put(defender_base, row_keys, scores)
+        return scores
+
+    def _top_attackers_parallel(self, defenders: list[Pokemon], sort_by: int, backend: str, workers: int):
+        # Defenders are sharded over a process pool that gets the movesets once in its initializer.
+        # Results are merged in defender order so the sums, and the output, match the serial backends exactly.
+        rows, keys = self._moveset_rows(unique=backend == 'numpy')
+        chunk_size = max(1, len(defenders) // (workers * 4))
+        chunks = [list(range(i, min(i + chunk_size, len(defenders)))) for i in range(0, len(defenders), chunk_size)]
+        totals = np.zeros((3, len(rows)))
+        running = {}
+        REGISTRY.preload()  # forked workers inherit the tables instead of reading them again
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(rows, defenders, backend))
+        with pool, self.profiler.phase('score_defenders_parallel'):
+            for scores in pool.map(score_defenders, chunks):
+                for defender_index, defender_scores in scores:
+                    print(f'Calculated Metrics for all pokemon against {defenders[defender_index].name}')
+                    if backend == 'numpy':
+                        totals += defender_scores
+                        continue
+                    for row, (key, row_scores) in enumerate(zip(keys, defender_scores.T.tolist())):
+                        if key not in running:
+                            running[key] = RunningMetrics(row)
+                        running[key].add(*row_scores)
+        if backend == 'numpy':
+            averages = (totals / len(defenders)).T.tolist()
+            candidates = (
+                (attacker_base, pid.startswith('True'), averages[row], row)
+                for row, (attacker_base, pid) in enumerate(keys)
+            )
+        else:
+            candidates = (
+                (attacker_base, pid.startswith('True'), entry.averages(), entry.first)
+                for (attacker_base, pid), entry in running.items()
+            )
+        return rows, self._best_movesets(candidates, sort_by)
+
     def get_original_pokemon_by_name(self, name: str):
-        for pokemon in self.pokemon_list:
-            if pokemon.name == name:
-                return pokemon
-        return None
+        return self.catalog.pokemon_named(name)
 
     def hidden_power(self, list_to_add: list):
-        normal_to_copy = self.get_move_by_name('hidden power')
+        hidden_power_move = self.get_move_by_name('hidden power')
         for typing in [
             'fighting',
             'flying',
@@ -286,16 +841,32 @@ class Metrics:
             'dragon',
             'dark'
         ]:
-            move_copy = copy.deepcopy(normal_to_copy)
-            move_copy.name += ' ' + typing
-            move_copy.typing = typing
-            list_to_add.append(move_copy)
+            name = hidden_power_move.name + ' ' + typing
+            list_to_add.append(self.catalog.move_variant(hidden_power_move, name=name, typing=typing))
+
+    def _intern_hidden_power(self):
+        # the hidden power variants the pokemon already point at, so a pokemon built later shares them
+        hidden_power_move = self.get_move_by_name('hidden power')
+        if hidden_power_move is None:
+            return
+        for mon in self.pokemon_list:
+            for move in mon.fast_moves + mon.elite_fast_moves:
+                if move is not None and move.name.startswith(hidden_power_move.name + ' '):
+                    self.catalog.add_move_variant(hidden_power_move, move, name=move.name, typing=move.typing)
 
     def get_list_of_pokemon(self, hidden_power: bool = True) -> list[Pokemon]:
         pm_all_moves = []
+        with self.profiler.phase('get_list_of_pokemon'):
+            for pokemon in self._pokemon_entries():
+                pm_all_moves += self._build_pokemon(pokemon, hidden_power)
+        return pm_all_moves
+
+    def _pokemon_entries(self, gm: list = None) -> list[dict]:
+        # one pokemonSettings entry per species and per form that differs from the ones before it
         pm_entry_pokemon_list = []
+        seen = {}  # fingerprint -> type2 of every added entry with it, see _fingerprint
         counter = 0
-        for entry in self.gm:
+        for entry in self.gm if gm is None else gm:
             tid = entry['templateId']
             if 'pokemonSettings' in entry['data'] and re.search(r'^V[0-9]{4}_POKEMON_', tid):
                 pokemon_id = entry['data']['pokemonSettings']['pokemonId'].replace('_MALE', '').replace('_FEMALE', '')
@@ -307,135 +878,322 @@ class Metrics:
                         # print(tid)
                         counter += 1
                     pm_entry_pokemon_list.append(entry['data'])
+                    self._add_fingerprint(seen, entry['data'])
                 else:
-                    for added_entry in pm_entry_pokemon_list:
-                        if not _is_different(entry['data'], added_entry, tid):
-                            break
-                    else:
+                    fingerprint, type_2 = _fingerprint(entry['data'])
+                    type_2s = seen.get(fingerprint, [])
+                    if tid in ['V0250_POKEMON_HO_OH_S', 'V0249_POKEMON_LUGIA_S'] or not (
+                            type_2s and (type_2 is None or None in type_2s or type_2 in type_2s)
+                    ):
                         if '_NORMAL' in tid:
                             counter += 1
                             if tid[:-7] not in self._tids_to_exclude:
                                 raise Exception(f'The tid {tid} has different stats from the non-normal version')
                         pm_entry_pokemon_list.append(entry['data'])
-        for pokemon in pm_entry_pokemon_list:
-            if 'quickMoves' not in pokemon['pokemonSettings']:
-                continue  # Smeargle doesn't have moves
-            if pokemon['templateId'] in self._pokemon_without_base_stats:
-                pokemon['pokemonSettings']['stats'] = self._pokemon_without_base_stats[pokemon['templateId']]['stats']
-            mon = Pokemon(
-                name=pokemon['templateId'].split('_POKEMON_')[1].replace('_', ' ').lower(),
-                base_atk=pokemon['pokemonSettings']['stats']['baseAttack'],
-                base_defn=pokemon['pokemonSettings']['stats']['baseDefense'],
-                base_stm=pokemon['pokemonSettings']['stats']['baseStamina'],
-                type_1=pokemon['pokemonSettings']['type'].split('POKEMON_TYPE_')[1].lower(),
-            )
-            if 'type2' in pokemon['pokemonSettings']:
-                mon.type_2 = pokemon['pokemonSettings']['type2'].split('POKEMON_TYPE_')[1].lower()
-            if 'shadow' in pokemon['pokemonSettings']:
-                mon.shadow_available = True
-
-            elite_charged = []
-            if 'shadow' in pokemon['pokemonSettings']:
-                elite_charged += [
-                    pokemon['pokemonSettings']['shadow']['shadowChargeMove'],
-                    pokemon['pokemonSettings']['shadow']['purifiedChargeMove']
-                ]
-            if 'eliteCinematicMove' in pokemon['pokemonSettings']:
-                elite_charged += pokemon['pokemonSettings']['eliteCinematicMove']
-            if not mon.shadow_available:
-                elite_charged += ['RETURN']
-            if 'eliteQuickMove' in pokemon['pokemonSettings']:
-                elite_fast = pokemon['pokemonSettings']['eliteQuickMove']
-                for move in elite_fast:
-                    if move == 'HIDDEN_POWER_FAST' and hidden_power:
-                        self.hidden_power(mon.elite_fast_moves)
-                    else:
-                        if type(move) == int:
-                            move = self._moves_without_names[move] + '_fast'
-                        mon.elite_fast_moves.append(self.get_move_by_name(move[:-5].replace('_', ' ').lower()))
-            if 'rayquaza' in mon.name:
-                elite_charged.append('dragon ascent')
-            for move in pokemon['pokemonSettings']['quickMoves']:
+                        self._add_fingerprint(seen, entry['data'])
+        return pm_entry_pokemon_list
+
+    @staticmethod
+    def _add_fingerprint(seen: dict, entry: dict):
+        fingerprint, type_2 = _fingerprint(entry)
+        seen.setdefault(fingerprint, []).append(type_2)
+
+    def _build_pokemon(self, pokemon: dict, hidden_power: bool = True) -> list[Pokemon]:
+        # the entry's megas followed by the pokemon itself
+        pm_all_moves = []
+        if 'quickMoves' not in pokemon['pokemonSettings']:
+            return pm_all_moves  # Smeargle doesn't have moves
+        stats = pokemon['pokemonSettings']['stats']
+        if pokemon['templateId'] in self._pokemon_without_base_stats:  # its gm entry has no or incomplete stats
+            stats = self._pokemon_without_base_stats[pokemon['templateId']]['stats']
+        mon = Pokemon(
+            name=pokemon['templateId'].split('_POKEMON_')[1].replace('_', ' ').lower(),
+            base_atk=stats['baseAttack'],
+            base_defn=stats['baseDefense'],
+            base_stm=stats['baseStamina'],
+            type_1=pokemon['pokemonSettings']['type'].split('POKEMON_TYPE_')[1].lower(),
+        )
+        if 'type2' in pokemon['pokemonSettings']:
+            mon.type_2 = pokemon['pokemonSettings']['type2'].split('POKEMON_TYPE_')[1].lower()
+        if 'shadow' in pokemon['pokemonSettings']:
+            mon.shadow_available = True
+
+        elite_charged = []
+        if 'shadow' in pokemon['pokemonSettings']:
+            elite_charged += [
+                pokemon['pokemonSettings']['shadow']['shadowChargeMove'],
+                pokemon['pokemonSettings']['shadow']['purifiedChargeMove']
+            ]
+        if 'eliteCinematicMove' in pokemon['pokemonSettings']:
+            elite_charged += pokemon['pokemonSettings']['eliteCinematicMove']
+        if not mon.shadow_available:
+            elite_charged += ['RETURN']
+        if 'eliteQuickMove' in pokemon['pokemonSettings']:
+            elite_fast = pokemon['pokemonSettings']['eliteQuickMove']
+            for move in elite_fast:
                 if move == 'HIDDEN_POWER_FAST' and hidden_power:
-                    self.hidden_power(mon.fast_moves)
+                    self.hidden_power(mon.elite_fast_moves)
                 else:
-                    if move == 'STRUGGLE':
-                        move += '_FAST'
                     if type(move) == int:
-                        move = self._moves_without_names[move]
-                    mon.fast_moves.append(self.get_move_by_name(move[:-5].replace('_', ' ').lower()))
-            for move in pokemon['pokemonSettings']['cinematicMoves']:
-                # Chimecho has psyshock twice
-                # Galarian Weezing has hyper beam twice
-                # Trubbish has gunk shot twice
-                if type(move) == int:
-                    move = self._moves_without_names[move]
-                mon.charged_moves.append(self.get_move_by_name(move.lower().replace('_', ' ')))
-            mon.tid = pokemon['templateId']
-            for move in elite_charged:
+                        move = self._moves_without_names[move] + '_fast'
+                    mon.elite_fast_moves.append(self.get_move_by_name(move[:-5].replace('_', ' ').lower()))
+        if 'rayquaza' in mon.name:
+            elite_charged.append('dragon ascent')
+        for move in pokemon['pokemonSettings']['quickMoves']:
+            if move == 'HIDDEN_POWER_FAST' and hidden_power:
+                self.hidden_power(mon.fast_moves)
+            else:
+                if move == 'STRUGGLE':
+                    move += '_FAST'
                 if type(move) == int:
                     move = self._moves_without_names[move]
-                mon.elite_charged_moves.append(self.get_move_by_name(move.lower().replace('_', ' ')))
-            if 'pokemonClass' in pokemon['pokemonSettings']:
-                mon.legendary = True if 'LEGENDARY' in pokemon['pokemonSettings']['pokemonClass'] else False
-                mon.mythical = True if 'MYTHIC' in pokemon['pokemonSettings']['pokemonClass'] else False
-                mon.ultra_beast = True if 'ULTRA_BEAST' in pokemon['pokemonSettings']['pokemonClass'] else False
-            if 'tempEvoOverrides' in pokemon['pokemonSettings']:
-                for possible_mega in pokemon['pokemonSettings']['tempEvoOverrides']:
-                    if 'tempEvoId' in possible_mega:  # why the fuck is aggron fucked up
-                        mega_mon = copy.deepcopy(mon)
-                        mega_mon.is_mega = True
-                        mega_mon.base_atk = possible_mega['stats']['baseAttack']
-                        mega_mon.base_defn = possible_mega['stats']['baseDefense']
-                        mega_mon.base_stm = possible_mega['stats']['baseStamina']
-                        mega_mon.type_1 = possible_mega['typeOverride1'].split('POKEMON_TYPE_')[1].lower()
-                        if 'typeOverride2' in possible_mega:
-                            mega_mon.type_2 = possible_mega['typeOverride2'].split('POKEMON_TYPE_')[1].lower()
-                        else:
-                            mega_mon.type_2 = ''
-                        prefix = possible_mega['tempEvoId'].split('TEMP_EVOLUTION_')[1].lower().replace('_', ' ')
-                        mega_mon.name = prefix + ' ' + mega_mon.name
-                        pm_all_moves.append(mega_mon)
-            pm_all_moves.append(mon)
+                mon.fast_moves.append(self.get_move_by_name(move[:-5].replace('_', ' ').lower()))
+        for move in pokemon['pokemonSettings']['cinematicMoves']:
+            # Chimecho has psyshock twice
+            # Galarian Weezing has hyper beam twice
+            # Trubbish has gunk shot twice
+            if type(move) == int:
+                move = self._moves_without_names[move]
+            mon.charged_moves.append(self.get_move_by_name(move.lower().replace('_', ' ')))
+        mon.tid = pokemon['templateId']
+        for move in elite_charged:
+            if type(move) == int:
+                move = self._moves_without_names[move]
+            mon.elite_charged_moves.append(self.get_move_by_name(move.lower().replace('_', ' ')))
+        if 'pokemonClass' in pokemon['pokemonSettings']:
+            mon.legendary = True if 'LEGENDARY' in pokemon['pokemonSettings']['pokemonClass'] else False
+            mon.mythical = True if 'MYTHIC' in pokemon['pokemonSettings']['pokemonClass'] else False
+            mon.ultra_beast = True if 'ULTRA_BEAST' in pokemon['pokemonSettings']['pokemonClass'] else False
+        if 'tempEvoOverrides' in pokemon['pokemonSettings']:
+            for possible_mega in pokemon['pokemonSettings']['tempEvoOverrides']:
+                if 'tempEvoId' in possible_mega:  # why the fuck is aggron fucked up
+                    type_2 = ''
+                    if 'typeOverride2' in possible_mega:
+                        type_2 = possible_mega['typeOverride2'].split('POKEMON_TYPE_')[1].lower()
+                    prefix = possible_mega['tempEvoId'].split('TEMP_EVOLUTION_')[1].lower().replace('_', ' ')
+                    pm_all_moves.append(mon.variant(
+                        name=prefix + ' ' + mon.name,
+                        is_mega=True,
+                        base_atk=possible_mega['stats']['baseAttack'],
+                        base_defn=possible_mega['stats']['baseDefense'],
+                        base_stm=possible_mega['stats']['baseStamina'],
+                        type_1=possible_mega['typeOverride1'].split('POKEMON_TYPE_')[1].lower(),
+                        type_2=type_2,
+                    ))
+        self._apply_overrides(mon)
+        pm_all_moves.append(mon)
         return pm_all_moves
 
+    @property
+    def scores_hash(self) -> str:
+        # what the result cache and counter matrix are keyed on, gm_hash plus the cpm table
+        return scores_hash(self.gm_hash, REGISTRY.table_hash('cpm'))
+
+    def _catalog_hash(self, source_hash: str) -> str:
+        return catalog_hash(source_hash, self._overrides(), REGISTRY.table_hash('type_effectiveness'))
+
+    def _overrides(self) -> dict:
+        # everything the catalog is built with besides the gm, part of its hash so snapshots and caches follow it
+        return {'pokemon_without_base_stats': self._pokemon_without_base_stats, 'extra_moves': self._extra_moves}
+
+    def _apply_overrides(self, mon: Pokemon):
+        # Only called while a pokemon is built, so however many queries run the extra moves are there exactly once
+        for field, move_names in self._extra_moves.get(mon.name, {}).items():
+            getattr(mon, field).extend(self.get_move_by_name(move_name) for move_name in move_names)
+
     def get_list_of_moves(self) -> list[Move]:
         _moves_list = []
-        for entry in self.gm:
-            if re.search(r'^V[0-9]{4}_MOVE_', entry['templateId']):
-                if type(entry['data']['moveSettings']['movementId']) == int:
-                    name = self._moves_without_names[entry['data']['moveSettings']['movementId']]
-                else:
-                    name = entry['data']['moveSettings']['movementId'].lower().replace('_fast', '')
-                name = name.replace('_', ' ')  # if a move has a _ replace it with a space
-                if name in self._unused_moves:
-                    continue
-                if 'energyDelta' not in entry['data']['moveSettings']:  # Struggle
-                    energy_delta = 33  # gamepress has it as 33, pvp is 100
-                else:
-                    energy_delta = abs(entry['data']['moveSettings']['energyDelta'])
-                if 'power' not in entry['data']['moveSettings']:  # Splash, Transform, & Yawn
-                    power = 0
-                else:
-                    power = entry['data']['moveSettings']['power']
-                _moves_list.append(Move(
-                    name=name,
-                    typing=entry['data']['moveSettings']['pokemonType'].split('_')[2].lower(),
-                    power=power,
-                    energy_delta=energy_delta,
-                    damage_window_start_ms=entry['data']['moveSettings']['damageWindowStartMs'],
-                    damage_window_end_ms=entry['data']['moveSettings']['damageWindowEndMs'],
-                    duration_ms=entry['data']['moveSettings']['durationMs']
-                ))
+        gm = self.gm  # parsing it is its own phase
+        with self.profiler.phase('get_list_of_moves'):
+            for entry in gm:
+                if re.search(r'^V[0-9]{4}_MOVE_', entry['templateId']):
+                    move = self._build_move(entry)
+                    if move is not None:
+                        _moves_list.append(move)
         return _moves_list
 
+    def _move_name(self, entry: dict) -> str:
+        if type(entry['data']['moveSettings']['movementId']) == int:
+            name = self._moves_without_names[entry['data']['moveSettings']['movementId']]
+        else:
+            name = entry['data']['moveSettings']['movementId'].lower().replace('_fast', '')
+        return name.replace('_', ' ')  # if a move has a _ replace it with a space
+
+    def _build_move(self, entry: dict) -> Move | None:
+        name = self._move_name(entry)
+        if name in self._unused_moves:
+            return None
+        if 'energyDelta' not in entry['data']['moveSettings']:  # Struggle
+            energy_delta = 33  # gamepress has it as 33, pvp is 100
+        else:
+            energy_delta = abs(entry['data']['moveSettings']['energyDelta'])
+        if 'power' not in entry['data']['moveSettings']:  # Splash, Transform, & Yawn
+            power = 0
+        else:
+            power = entry['data']['moveSettings']['power']
+        return Move(
+            name=name,
+            typing=entry['data']['moveSettings']['pokemonType'].split('_')[2].lower(),
+            power=power,
+            energy_delta=energy_delta,
+            damage_window_start_ms=entry['data']['moveSettings']['damageWindowStartMs'],
+            damage_window_end_ms=entry['data']['moveSettings']['damageWindowEndMs'],
+            duration_ms=entry['data']['moveSettings']['durationMs']
+        )
+
     def get_move_by_name(self, move_name):
-        for move in self.move_list:
-            if move.name == move_name:
-                return move
-        return None
-
-    def update_gms(self):
-        pokeminers_gm_url = 'https://raw.githubusercontent.com/PokeMiners/game_masters/master/latest/latest.json'
-        self.gm = requests.get(url=pokeminers_gm_url).json()
-        open('./data/pokeminers_gm.json', 'w').write(json.dumps(self.gm, indent=4))
+        return self.catalog.move(move_name)
+
+    def apply_gm(self, new_gm: list, old_gm: list = None) -> GmUpdate:
+        # Diffs the current gm against new_gm by templateId, rebuilds only the moves and pokemon that changed
+        # (or use a move that changed) and recomputes just the cached matchups that involve them.
+        # Everything is built aside first, so if new_gm can't be read this instance keeps the old one.
+        old_gm = old_gm if old_gm is not None else self.gm
+        update = diff_gms(old_gm, new_gm)
+        if not update:
+            self.gm = new_gm
+            return update
+        entries = self._pokemon_entries(new_gm)
+        old_catalog = self.catalog
+        old_move_entries = {
+            entry['templateId']: entry for entry in old_gm if entry['templateId'] in update.changed_moves
+        }
+        stale_moves = {self._move_name(old_move_entries[tid]) for tid in update.changed_moves}
+        stale_moves |= {self._move_name(entry) for entry in old_gm if entry['templateId'] in update.removed_moves}
+        rebuilt_moves = set(update.added_moves + update.changed_moves)
+        move_list = []
+        for entry in new_gm:
+            if re.search(r'^V[0-9]{4}_MOVE_', entry['templateId']):
+                if entry['templateId'] in rebuilt_moves:
+                    move = self._build_move(entry)
+                    if move is not None:
+                        stale_moves.add(move.name)
+                else:
+                    move = old_catalog.move(self._move_name(entry))
+                if move is not None:
+                    move_list.append(move)
+        catalog = Catalog(move_list)
+        catalog.keep_move_variants(old_catalog)  # unchanged pokemon keep pointing at the old hidden power variants
+
+        rebuilt_tids = set(update.added_pokemon + update.changed_pokemon)
+        pokemon_list = []
+        self.catalog = catalog  # _build_pokemon looks the moves up in it
+        try:
+            for entry in entries:
+                group = old_catalog.pokemon_with_tid(entry['templateId'])
+                rebuild = entry['templateId'] in rebuilt_tids or not group
+                if rebuild or any(self._uses_moves(mon, stale_moves) for mon in group):
+                    group = self._build_pokemon(entry, hidden_power=self.include_hidden_power)
+                    update.rebuilt_pokemon.append(entry['templateId'])
+                pokemon_list += group
+            catalog.add_pokemon(pokemon_list)
+        except BaseException:
+            self.catalog = old_catalog
+            raise
+        self.gm = new_gm
+        self.move_list = move_list
+        self.pokemon_list = pokemon_list
+        # results and the counter matrix of the old gm are stale, update_gms keys them on the file's hash after this
+        self.gm_hash = self._catalog_hash(parsed_gm_hash(new_gm))
+        self.counter_matrix = None
+        if self.result_cache is not None:
+            self.result_cache.invalidate(self.scores_hash)
+
+        if self.matchup_cache is not None:
+            update.recomputed_matchups = self._refresh_matchups(old_catalog, set(update.rebuilt_pokemon))
+        return update
+
+    @staticmethod
+    def _uses_moves(mon: Pokemon, move_names: set[str]) -> bool:
+        for move in mon.fast_moves + mon.charged_moves + mon.elite_fast_moves + mon.elite_charged_moves:
+            if move is None:
+                continue
+            if move.name in move_names or (move.name.startswith('hidden power ') and 'hidden power' in move_names):
+                return True
+        return False
+
+    def _refresh_matchups(self, old_catalog: Catalog, rebuilt_tids: set[str]) -> int:
+        # Forget every cached score of a pokemon that was rebuilt or removed, as attacker and as defender,
+        # then score those again against the defenders that are still cached
+        changed = [
+            mon for mon in old_catalog.pokemon
+            if mon.tid in rebuilt_tids or mon.tid not in self.catalog.pokemon_by_tid
+        ]
+        changed_rows = [
+            MatchupCache.row_key(mon, is_shadow, fast_move, charged_move)
+            for mon in changed for is_shadow, fast_move, charged_move in self.movesets(mon)
+        ]
+        changed_defenders = [MatchupCache.defender_key(mon) for mon in changed]
+        cached_defenders = self.matchup_cache.defender_keys()
+        self.matchup_cache.invalidate(changed_rows, changed_defenders)
+
+        rows, _ = self._moveset_rows(unique=True)
+        row_keys = [MatchupCache.row_key(*row) for row in rows]
+        batch = BatchMetrics(rows)
+        defenders_by_key = {MatchupCache.defender_key(mon): mon for mon in self.pokemon_list}
+        recomputed = 0
+        for key in cached_defenders:
+            if key not in defenders_by_key:
+                continue  # the defender is gone from the gm
+            scores = self.matchup_cache.get(defenders_by_key[key], row_keys)
+            recomputed += int(np.count_nonzero(np.isnan(scores[0])))
+            self._score_defender(defenders_by_key[key], rows, batch, row_keys)
+        return recomputed
+
+    def _gm_meta_path(self) -> str:
+        return self.gm_path + '.meta'
+
+    def _load_gm_meta(self) -> dict:
+        try:
+            with open(self._gm_meta_path()) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def update_gms(self, url: str = None, timeout: float = 60) -> GmUpdate:
+        # Conditional request on the stored ETag/Last-Modified, a 304 costs nothing else.
+        # A new gm is streamed (gzip/deflate decoded on the fly) into a temp file that replaces the old one atomically.
+        url = url or self.GM_URL
+        meta = self._load_gm_meta()
+        headers = {'Accept-Encoding': 'gzip, deflate'}
+        if meta.get('url') == url:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        with requests.get(url=url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 304:
+                return GmUpdate()
+            response.raise_for_status()
+            directory = os.path.dirname(self.gm_path) or '.'
+            with tempfile.NamedTemporaryFile('wb', dir=directory, suffix='.tmp', delete=False) as tmp_file:
+                try:
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        tmp_file.write(chunk)
+                    tmp_file.flush()
+                    os.fsync(tmp_file.fileno())
+                except BaseException:
+                    tmp_file.close()
+                    os.remove(tmp_file.name)
+                    raise
+            new_meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        # applied before the file is replaced, so a gm that can't be read leaves both the file and this instance as is
+        try:
+            with open(tmp_file.name) as gm_file:
+                update = self.apply_gm(json.load(gm_file))
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+        os.replace(tmp_file.name, self.gm_path)
+        self.gm_hash = self._catalog_hash(gm_hash(self.gm_path))
+        if self.result_cache is not None:
+            self.result_cache.invalidate(self.scores_hash)
+        if self.use_snapshot:
+            save_snapshot(self.gm_path, self.gm_hash, self.include_hidden_power, self.move_list, self.pokemon_list)
+        with open(self._gm_meta_path(), 'w') as meta_file:
+            json.dump(new_meta, meta_file)
+        return update
@@ -1,4 +1,21 @@
+import type_chart
+
+
 class Move:
+    __slots__ = (
+        'name',
+        '_typing',
+        'type_id',
+        'power',
+        'energy_delta',
+        'damage_window_start_ms',
+        'damage_window_end_ms',
+        'duration_ms',
+        'damage_window_start_s',
+        'damage_window_end_s',
+        'duration_s',
+    )
+
     def __init__(self, name, typing, power, energy_delta, damage_window_start_ms, damage_window_end_ms, duration_ms):
         self.name = name
         self.typing = typing
@@ -13,3 +30,21 @@ class Move:
         self.damage_window_start_s = self.damage_window_start_ms / 1000
         self.damage_window_end_s = self.damage_window_end_ms / 1000
         self.duration_s = self.duration_ms / 1000
+
+    @property
+    def typing(self) -> str:
+        return self._typing
+
+    @typing.setter
+    def typing(self, value: str):
+        self._typing = value
+        self.type_id = type_chart.TYPE_IDS[value]
+
+    def variant(self, **overrides) -> 'Move':
+        # a copy of the move with only the given fields changed, e.g. name and typing for hidden power
+        variant = object.__new__(Move)
+        for field in self.__slots__:
+            setattr(variant, field, getattr(self, field))
+        for field, value in overrides.items():
+            setattr(variant, field, value)
+        return variant
@@ -0,0 +1,36 @@
+import numpy as np
+from defender import Defender
+from pokemon_metrics import PokemonMetrics
+from batch_metrics import BatchMetrics
+
+# Filled once per worker process by init_worker so tasks only carry defender indexes
+_worker_state = {}
+
+
+def init_worker(rows: list, defenders: list, backend: str):
+    _worker_state['rows'] = rows
+    _worker_state['defenders'] = defenders
+    _worker_state['backend'] = backend
+    if backend == 'numpy':
+        _worker_state['batch'] = BatchMetrics(rows)
+
+
+def score_defenders(defender_indexes: list[int]) -> list[tuple[int, np.ndarray]]:
+    scores = []
+    for defender_index in defender_indexes:
+        defender_base = _worker_state['defenders'][defender_index]
+        if _worker_state['backend'] == 'numpy':
+            defender_scores = np.array(_worker_state['batch'].calculate_metrics(Defender(defender_mon=defender_base)))
+        else:
+            defender_scores = np.empty((3, len(_worker_state['rows'])))
+            for i, (attacker_base, is_shadow, fast_move, charged_move) in enumerate(_worker_state['rows']):
+                attacker = PokemonMetrics(
+                    attacker_base,
+                    fast_move,
+                    charged_move,
+                    is_shadow=is_shadow,
+                    defender=Defender(defender_mon=defender_base)
+                )
+                defender_scores[:, i] = attacker.dps, attacker.tdo, attacker.er
+        scores.append((defender_index, defender_scores))
+    return scores
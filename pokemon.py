@@ -1,4 +1,24 @@
-class Pokemon:
+from type_chart import Typed
+
+
+class Pokemon(Typed):
+    __slots__ = (
+        'name',
+        'tid',
+        'fast_moves',
+        'charged_moves',
+        'elite_fast_moves',
+        'elite_charged_moves',
+        'available',
+        'shadow_available',
+        'base_atk',
+        'base_defn',
+        'base_stm',
+        'is_mega',
+        'legendary',
+        'mythical',
+        'ultra_beast',
+    )
 
     def __init__(self, name: str, base_atk: int, base_defn: int, base_stm: int, type_1: str = '', type_2: str = ''):
         self.name = name
@@ -20,3 +40,15 @@ class Pokemon:
         self.legendary = False
         self.mythical = False
         self.ultra_beast = False
+
+    def variant(self, **overrides) -> 'Pokemon':
+        # A form of this pokemon (e.g. a mega) with only the given fields changed. It points at the same
+        # Move objects, the move lists themselves are copied so adding a move to one form doesn't touch the other
+        variant = object.__new__(Pokemon)
+        for field in self.__slots__:
+            value = getattr(self, field)
+            setattr(variant, field, list(value) if type(value) == list else value)
+        variant.set_types(overrides.pop('type_1', self.type_1), overrides.pop('type_2', self.type_2))
+        for field, value in overrides.items():
+            setattr(variant, field, value)
+        return variant
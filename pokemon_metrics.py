@@ -1,14 +1,39 @@
-import json
+from collections import OrderedDict
 from move import Move
 from defender import Defender
 from pokemon import Pokemon
+import type_chart
+from data_registry import RegistryTable
 
 
 class PokemonMetrics:
-    _CPM_DICT = json.load(open('./data/cpm.json'))
+    __slots__ = (
+        'original',
+        'name',
+        '_dps',
+        '_tdo',
+        '_er',
+        '_dirty',
+        'fast_move',
+        'elite_fast_move',
+        'charged_move',
+        'elite_charged_move',
+        'atk_iv',
+        'defn_iv',
+        'hp_iv',
+        'level',
+        'is_shadow',
+        'defender',
+        'atk',
+        'defn',
+        'stm',
+    )
+    _CPM_DICT = RegistryTable('cpm')
     SHADOW_POKEMON_BONUS_MULTIPLIER = 1.2
     SAME_TYPE_ATTACK_BONUS_MULTIPLIER = 1.2
-    TYPE_DICT = json.load(open('./data/type_effectiveness.json'))
+    TYPE_DICT = RegistryTable('type_effectiveness')
+    INTAKE_CACHE_SIZE = 100000
+    _intake_cache = OrderedDict()  # shared by every instance, see intake
 
     def __init__(
             self,
@@ -20,15 +45,16 @@ class PokemonMetrics:
             hp_iv: int = 15,
             level: float = 40,
             is_shadow: bool = False,
-            defender: Defender = Defender(),
+            defender: Defender = None,
     ):
         self.original = pokemon
         self.name = self.original.name
         if is_shadow:
             self.name = 'shadow ' + self.name
-        self.dps = 0
-        self.tdo = 0
-        self.er = 0
+        self._dps = 0
+        self._tdo = 0
+        self._er = 0
+        self._dirty = True
         self.fast_move = fast_move
         self.elite_fast_move = False
         self.charged_move = charged_move
@@ -40,31 +66,83 @@ class PokemonMetrics:
         self.level = level
 
         self.is_shadow = is_shadow
-        self.defender = defender
+        # a Defender() default arg would load the type chart on import
+        self.defender = defender if defender is not None else Defender()
+        self._calculate_stats()
 
-        self.atk = (self.original.base_atk + self.atk_iv) * self._CPM_DICT[self.level - 1]
-        self.defn = (self.original.base_defn + self.defn_iv) * self._CPM_DICT[self.level - 1]
-        self.stm = (self.original.base_stm + self.hp_iv) * self._CPM_DICT[self.level - 1]
+    # dps, tdo and er are only calculated when read after something they depend on changed
+    @property
+    def dps(self) -> float:
+        if self._dirty:
+            self.calculate_metrics()
+        return self._dps
+
+    @property
+    def tdo(self) -> float:
+        if self._dirty:
+            self.calculate_metrics()
+        return self._tdo
+
+    @property
+    def er(self) -> float:
+        if self._dirty:
+            self.calculate_metrics()
+        return self._er
+
+    @classmethod
+    def cpm(cls, level: float) -> float:
+        # cpm.json only has whole levels, a half level's cpm squared is the mean of its neighbours' squared
+        if level == int(level):
+            return cls._CPM_DICT[int(level) - 1]
+        lower = cls._CPM_DICT[int(level) - 1]
+        upper = cls._CPM_DICT[int(level)]
+        return ((lower ** 2 + upper ** 2) / 2) ** 0.5
+
+    @classmethod
+    def levels(cls) -> list[float]:
+        return [level / 2 for level in range(2, 2 * len(cls._CPM_DICT) + 1)]
+
+    def _calculate_stats(self):
+        cpm = self.cpm(self.level)
+        self.atk = (self.original.base_atk + self.atk_iv) * cpm
+        self.defn = (self.original.base_defn + self.defn_iv) * cpm
+        self.stm = (self.original.base_stm + self.hp_iv) * cpm
         if self.is_shadow:
             self.atk *= self.SHADOW_POKEMON_BONUS_MULTIPLIER
             self.defn *= 0.8333333
-        self.calculate_metrics()
+        self._dirty = True
 
-    def set_stats(
-            self, atk_iv: int = None, defn_iv: int = None, hp_iv: int = None, level: int = None, is_shadow: bool = None
+    def update(
+            self,
+            atk_iv: int = None,
+            defn_iv: int = None,
+            hp_iv: int = None,
+            level: float = None,
+            is_shadow: bool = None,
+            charged_move: Move = None,
+            fast_move: Move = None,
+            defender: Defender = None
     ):
+        # changes any number of fields, the metrics are recalculated at most once on the next read
         self.atk_iv = atk_iv if atk_iv is not None else self.atk_iv
         self.defn_iv = defn_iv if defn_iv is not None else self.defn_iv
         self.hp_iv = hp_iv if hp_iv is not None else self.hp_iv
         self.level = level if level is not None else self.level
         self.is_shadow = is_shadow if is_shadow is not None else self.is_shadow
-        self.atk = (self.original.base_atk + self.atk_iv) * self._CPM_DICT[self.level - 1]
-        self.defn = (self.original.base_defn + self.defn_iv) * self._CPM_DICT[self.level - 1]
-        self.stm = (self.original.base_stm + self.hp_iv) * self._CPM_DICT[self.level - 1]
-        if self.is_shadow:
-            self.atk *= self.SHADOW_POKEMON_BONUS_MULTIPLIER
-            self.defn *= 0.8333333
-        self.calculate_metrics()
+        self.charged_move = charged_move if charged_move is not None else self.charged_move
+        self.fast_move = fast_move if fast_move is not None else self.fast_move
+        self.defender = defender if defender is not None else self.defender
+        self._calculate_stats()
+
+    def set_stats(
+            self,
+            atk_iv: int = None,
+            defn_iv: int = None,
+            hp_iv: int = None,
+            level: float = None,
+            is_shadow: bool = None
+    ):
+        self.update(atk_iv=atk_iv, defn_iv=defn_iv, hp_iv=hp_iv, level=level, is_shadow=is_shadow)
 
     def set_attributes(
             self,
@@ -72,39 +150,62 @@ class PokemonMetrics:
             fast_move: Move = None,
             defender: Defender = None
     ):
-        self.charged_move = charged_move if charged_move is not None else self.charged_move
-        self.fast_move = fast_move if fast_move is not None else self.fast_move
-        self.defender = defender if defender is not None else self.defender
-        self.calculate_metrics()
+        self.update(charged_move=charged_move, fast_move=fast_move, defender=defender)
 
     def calculate_cp(self):
         return int(max(10, self.atk * ((self.defn * self.stm) ** 0.5) / 10))
 
-    def intake(self):
-        sum_x = 0
+    @classmethod
+    def clear_intake_cache(cls):
+        cls._intake_cache.clear()
+
+    def intake_profile(self, f_moves: list[Move], c_moves: list[Move]) -> tuple[list[float], float]:
+        # Everything in intake that doesn't depend on the attacker's own moves
+        t_values = []
         sum_y = 0
+        for fast_move in f_moves:
+            for charged_move in c_moves:
+                fdmg = self.damage(fast_move, self.defender, self.original, self.defender.atk, self.defn)
+                cdmg = self.damage(charged_move, self.defender, self.original, self.defender.atk, self.defn)
+                ce = charged_move.energy_delta
+                fdur = fast_move.duration_s + 2
+                cdur = charged_move.duration_s + 2
+                n = max(1, 3 * ce / 100)
+                t_values.append(((n * fdmg) + cdmg) / (n + 1))
+                sum_y += ((n * fdmg) + cdmg) / ((n * fdur) + cdur)
+        return t_values, sum_y
+
+    def intake(self):
         f_moves = self.defender.pokemon.fast_moves
         c_moves = self.defender.pokemon.charged_moves
         if self.defender.fast_move is not None:
             f_moves = [self.defender.fast_move]
         if self.defender.charged_move is not None:
             c_moves = [self.defender.charged_move]
-        for fast_move in f_moves:
-            self.defender.fast_move = fast_move
-            for charged_move in c_moves:
-                self.defender.charged_move = charged_move
-                fdmg = self.damage(self.defender.fast_move, self.defender, self.original, self.defender.atk, self.defn)
-                cdmg = self.damage(
-                    self.defender.charged_move, self.defender, self.original, self.defender.atk, self.defn
-                )
-                ce = self.defender.charged_move.energy_delta
-                fdur = self.defender.fast_move.duration_s + 2
-                cdur = self.defender.charged_move.duration_s + 2
-                n = max(1, 3 * ce / 100)
-                t = ((n * fdmg) + cdmg) / (n + 1)
-                sum_x += (self.charged_move.energy_delta * 0.5) + (self.fast_move.energy_delta * 0.5) + (0.5 * t)
-                sum_y += ((n * fdmg) + cdmg) / ((n * fdur) + cdur)
-        total = len(f_moves) * len(c_moves)
+        # The defender's damage only depends on it and the attacker's types and defense, so it is shared between
+        # every moveset of an attacker, and between every attacker with the same types and defense
+        key = (
+            self.defender.pokemon,
+            self.defender.type_mask,
+            self.defender.atk,
+            self.defender.fast_move,
+            self.defender.charged_move,
+            self.original.dual_type_id,
+            self.defn
+        )
+        profile = self._intake_cache.get(key)
+        if profile is None:
+            profile = self.intake_profile(f_moves, c_moves)
+            self._intake_cache[key] = profile
+            if len(self._intake_cache) > self.INTAKE_CACHE_SIZE:
+                self._intake_cache.popitem(last=False)
+        else:
+            self._intake_cache.move_to_end(key)
+        t_values, sum_y = profile
+        sum_x = 0
+        for t in t_values:
+            sum_x += (self.charged_move.energy_delta * 0.5) + (self.fast_move.energy_delta * 0.5) + (0.5 * t)
+        total = len(t_values)
         return {
             'x': sum_x / total,
             'y': sum_y / total
@@ -146,12 +247,13 @@ class PokemonMetrics:
         elif dps < fdps:
             dps = fdps
             tdo = dps * st
-        self.dps = dps
-        self.tdo = tdo
-        self.er = ((dps ** 3 * tdo) ** 0.25)
+        self._dps = dps
+        self._tdo = tdo
+        self._er = ((dps ** 3 * tdo) ** 0.25)
+        self._dirty = False
 
     def effectiveness(self, attacker_type: str, defender_type: str) -> float:
-        return self.TYPE_DICT[attacker_type][defender_type] if defender_type != '' else 1
+        return type_chart.EFFECTIVENESS_ROWS[type_chart.TYPE_IDS[attacker_type]][type_chart.TYPE_IDS[defender_type]]
 
     def damage(
             self,
@@ -161,9 +263,7 @@ class PokemonMetrics:
             attacker_atk: int,
             defender_defn: int
     ) -> float:
-        multiplier = 1
-        if attacker.type_1 == move.typing or attacker.type_2 == move.typing:
+        multiplier = type_chart.DUAL_TYPE_ROWS[move.type_id][defender.dual_type_id]
+        if attacker.type_mask >> move.type_id & 1:
             multiplier *= self.SAME_TYPE_ATTACK_BONUS_MULTIPLIER
-        multiplier *= self.effectiveness(move.typing, defender.type_1)
-        multiplier *= self.effectiveness(move.typing, defender.type_2)
         return 0.5 * attacker_atk / defender_defn * move.power * multiplier + 0.5
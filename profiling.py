@@ -0,0 +1,95 @@
+import importlib
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Profiler:
+    # Opt-in wall times per phase and event counters. While it's disabled phase() and count() return straight
+    # away, and the hot path methods in COUNTED_METHODS are only wrapped with counters while it's enabled,
+    # so they cost nothing otherwise.
+    COUNTED_METHODS = [
+        ('pokemon_metrics', 'PokemonMetrics', '__init__', 'pokemon_metrics'),
+        ('pokemon_metrics', 'PokemonMetrics', 'calculate_metrics', 'calculate_metrics'),
+        ('pokemon_metrics', 'PokemonMetrics', 'damage', 'damage'),
+        ('pokemon_metrics', 'PokemonMetrics', 'intake', 'intake'),
+        ('pokemon_metrics', 'PokemonMetrics', 'intake_profile', 'intake_cache_misses'),
+        ('batch_metrics', 'BatchMetrics', 'calculate_metrics', 'batch_calculate_metrics'),
+    ]
+    # hit rate name -> (hits counter, misses counter), a counter can be worked out as calls minus misses
+    HIT_RATES = {
+        'intake_cache': ('intake', 'intake_cache_misses'),
+        'result_cache': ('result_cache_hits', 'result_cache_misses'),
+        'matchup_cache': ('matchup_cache_hits', 'matchup_cache_misses'),
+        'snapshot': ('snapshot_hits', 'snapshot_misses'),
+    }
+
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}
+        self.counters = {}
+        self._originals = []
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        for module_name, class_name, method_name, counter in self.COUNTED_METHODS:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            original = cls.__dict__[method_name]
+            self._originals.append((cls, method_name, original))
+            setattr(cls, method_name, self._counted(original, counter))
+
+    def disable(self):
+        for cls, method_name, original in reversed(self._originals):
+            setattr(cls, method_name, original)
+        self._originals = []
+        self.enabled = False
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+
+    def _counted(self, method, counter: str):
+        @wraps(method)
+        def counted(*args, **kwargs):
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+            return method(*args, **kwargs)
+        return counted
+
+    def count(self, counter: str, amount: int = 1):
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            calls, seconds = self.phases.get(name, (0, 0.0))
+            self.phases[name] = (calls + 1, seconds + time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        counters = dict(self.counters)
+        hit_rates = {}
+        for name, (hits, misses) in self.HIT_RATES.items():
+            hit_count = counters.get(hits, 0)
+            miss_count = counters.get(misses, 0)
+            if name == 'intake_cache':
+                hit_count -= miss_count  # every intake call is a hit or a miss
+            if hit_count + miss_count:
+                hit_rates[name] = hit_count / (hit_count + miss_count)
+        return {
+            'enabled': self.enabled,
+            'phases': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.phases.items()},
+            'counters': counters,
+            'hit_rates': hit_rates,
+        }
+
+
+# PokemonMetrics and BatchMetrics are counted at the class level, so there's one profiler for the process
+PROFILER = Profiler()
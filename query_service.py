@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from metrics import Metrics
+from defender import Defender
+from pokemon_metrics import PokemonMetrics
+from result_cache import ResultCache
+from gm_snapshot import gm_hash
+from data_registry import REGISTRY, DATA_DIR_ENV
+
+# Filled once per worker process by init_worker, every worker keeps its own Metrics
+_worker_state = {}
+
+
+def init_worker(hidden_power: bool, result_cache_directory: str = None):
+    result_cache = ResultCache(result_cache_directory) if result_cache_directory else None
+    _worker_state['metrics'] = Metrics(hidden_power=hidden_power, result_cache=result_cache)
+
+
+def top_attackers(typing: str, sort_by: int, top: int, backend: str) -> dict:
+    metrics = _worker_state['metrics']
+    with contextlib.redirect_stdout(io.StringIO()):  # the per defender progress lines
+        columns = metrics.top_attackers_for_type(typing, sort_by, backend=backend, columnar=True, top=top)
+    attackers = []
+    for row in columns.order(sort_by)[:top]:
+        attackers.append({
+            'name': columns.name(row),
+            'fast_move': columns.moves[columns.fast_move[row]].name,
+            'charged_move': columns.moves[columns.charged_move[row]].name,
+            'elite_fast_move': bool(columns.elite_fast_move[row]),
+            'elite_charged_move': bool(columns.elite_charged_move[row]),
+            'dps': float(columns.dps[row]),
+            'tdo': float(columns.tdo[row]),
+            'er': float(columns.er[row]),
+        })
+    return {'gm_hash': metrics.gm_hash, 'type': typing, 'sort_by': sort_by, 'attackers': attackers}
+
+
+class QueryError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryService:
+    # Keeps a Metrics in memory and answers queries over HTTP/JSON (GET only, one request per connection):
+    #   /top_attackers?type=water&sort_by=3&top=100&backend=numpy
+    #   /raid_bosses?type=water
+    #   /pokemon_metrics?attacker=...&fast_move=...&charged_move=...&shadow=1&level=40&defender=...
+    #   /status
+    # top_attackers is scored in a process pool so it doesn't hold up the cheap queries, identical ones that
+    # come in while it's running wait on the same task and finished answers are kept per gm. The gm file is
+    # polled, when its hash changes a new Metrics and pool are built in the background and swapped in.
+    ANSWER_CACHE_SIZE = 256
+    STATUS_TEXT = {
+        200: 'OK',
+        400: 'Bad Request',
+        404: 'Not Found',
+        405: 'Method Not Allowed',
+        500: 'Internal Server Error',
+    }
+
+    def __init__(
+            self,
+            hidden_power: bool = False,
+            workers: int = None,
+            result_cache_directory: str = None,
+            poll_interval: float = 5
+    ):
+        self.hidden_power = hidden_power
+        self.workers = workers or os.cpu_count() or 1
+        self.result_cache_directory = result_cache_directory
+        self.poll_interval = poll_interval
+        self.metrics = None
+        self.pool = None
+        self.gm_stat = None
+        self.loaded_at = None
+        self.requests = 0
+        self._in_flight = {}
+        self._answers = OrderedDict()
+
+    def _load(self) -> tuple[Metrics, ProcessPoolExecutor]:
+        # builds the main process Metrics first so the workers find its snapshot, and forked ones its tables
+        metrics = Metrics(hidden_power=self.hidden_power)
+        REGISTRY.preload()
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(self.hidden_power, self.result_cache_directory)
+        )
+        return metrics, pool
+
+    def _swap(self, metrics: Metrics, pool: ProcessPoolExecutor, gm_stat: tuple):
+        old_pool = self.pool
+        self.metrics = metrics
+        self.pool = pool
+        self.gm_stat = gm_stat
+        self.loaded_at = time.time()
+        self._answers.clear()
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)  # queries already sent to it still finish
+
+    @staticmethod
+    def _stat_gm() -> tuple:
+        stat = os.stat(REGISTRY.gm_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    async def _watch_gm(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                gm_stat = self._stat_gm()
+                if gm_stat == self.gm_stat:
+                    continue
+                source_hash = await loop.run_in_executor(None, gm_hash, REGISTRY.gm_path)
+                if self.metrics._catalog_hash(source_hash) == self.metrics.gm_hash:
+                    self.gm_stat = gm_stat  # touched but the same gm
+                    continue
+                print('The gm changed, reloading...', flush=True)
+                metrics, pool = await loop.run_in_executor(None, self._load)
+                self._swap(metrics, pool, gm_stat)
+                print(f'Reloaded gm {self.metrics.gm_hash[:16]}', flush=True)
+            except (OSError, ValueError) as e:  # the gm is missing or half written, try again next time
+                print(f'Could not reload the gm: {e}', flush=True)
+
+    async def _coalesced(self, key: tuple, make_task):
+        # the first request for key starts the work, the rest wait for its answer
+        if key in self._answers:
+            self._answers.move_to_end(key)
+            return self._answers[key]
+        if key not in self._in_flight:
+            self._in_flight[key] = asyncio.ensure_future(make_task())
+        task = self._in_flight[key]
+        try:
+            answer = await asyncio.shield(task)
+        finally:
+            if task.done() and self._in_flight.get(key) is task:
+                del self._in_flight[key]
+        self._answers[key] = answer
+        while len(self._answers) > self.ANSWER_CACHE_SIZE:
+            self._answers.popitem(last=False)
+        return answer
+
+    @staticmethod
+    def _param(params: dict, name: str, default=None, cast=str):
+        if name not in params:
+            if default is None:
+                raise QueryError(400, f'Missing parameter {name}')
+            return default
+        try:
+            return cast(params[name][-1])
+        except ValueError:
+            raise QueryError(400, f'Bad value for {name}: {params[name][-1]}')
+
+    def _typing(self, params: dict) -> str:
+        typing = self._param(params, 'type').lower()
+        if typing not in self.metrics.TYPES:
+            raise QueryError(400, f'Unknown type {typing}')
+        return typing
+
+    async def top_attackers(self, params: dict) -> dict:
+        typing = self._typing(params)
+        sort_by = self._param(params, 'sort_by', 1, int)
+        top = self._param(params, 'top', 100, int)
+        backend = self._param(params, 'backend', 'numpy')
+        if sort_by not in [1, 2, 3]:
+            raise QueryError(400, 'sort_by is 1 (dps), 2 (tdo) or 3 (er)')
+        if top < 1:
+            raise QueryError(400, 'top has to be at least 1')
+        if backend not in ['python', 'numpy', 'matrix', 'simulate']:
+            raise QueryError(400, f'Unknown backend {backend}')
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        key = (self.metrics.gm_hash, 'top_attackers', typing, sort_by, top, backend)
+        return await self._coalesced(
+            key, lambda: loop.run_in_executor(pool, top_attackers, typing, sort_by, top, backend)
+        )
+
+    def raid_bosses(self, params: dict) -> dict:
+        typing = self._typing(params)
+        bosses = self.metrics.get_list_of_raid_weak_to(typing)
+        return {
+            'gm_hash': self.metrics.gm_hash,
+            'type': typing,
+            'bosses': [{'name': boss.name, 'type_1': boss.type_1, 'type_2': boss.type_2} for boss in bosses],
+        }
+
+    def _pokemon(self, name: str):
+        pokemon = self.metrics.catalog.pokemon_named(name.lower())
+        if pokemon is None:
+            raise QueryError(404, f'Unknown pokemon {name}')
+        return pokemon
+
+    def _move(self, name: str, moves: list):
+        # the pokemon's own move first, hidden power variants aren't in the catalog's moves
+        name = name.lower()
+        for move in moves:
+            if move is not None and move.name == name:
+                return move
+        move = self.metrics.catalog.move(name)
+        if move is None:
+            raise QueryError(404, f'Unknown move {name}')
+        return move
+
+    def pokemon_metrics(self, params: dict) -> dict:
+        attacker_base = self._pokemon(self._param(params, 'attacker'))
+        fast_move = self._move(
+            self._param(params, 'fast_move'), attacker_base.fast_moves + attacker_base.elite_fast_moves
+        )
+        charged_move = self._move(
+            self._param(params, 'charged_move'), attacker_base.charged_moves + attacker_base.elite_charged_moves
+        )
+        level = self._param(params, 'level', 40, float)
+        if level not in PokemonMetrics.levels():
+            raise QueryError(400, f'Unknown level {level}')
+        ivs = [self._param(params, iv, 15, int) for iv in ['atk_iv', 'defn_iv', 'hp_iv']]
+        if not all(0 <= iv <= 15 for iv in ivs):
+            raise QueryError(400, 'IVs go from 0 to 15')
+        defender = Defender()
+        if 'defender' in params:
+            defender = Defender(defender_mon=self._pokemon(self._param(params, 'defender')))
+        attacker = PokemonMetrics(
+            attacker_base,
+            fast_move,
+            charged_move,
+            *ivs,
+            level=level,
+            is_shadow=self._param(params, 'shadow', '0') in ['1', 'true'],
+            defender=defender
+        )
+        return {
+            'gm_hash': self.metrics.gm_hash,
+            'name': attacker.name,
+            'fast_move': fast_move.name,
+            'charged_move': charged_move.name,
+            'defender': None if defender.pokemon is None else defender.pokemon.name,
+            'cp': attacker.calculate_cp(),
+            'dps': attacker.dps,
+            'tdo': attacker.tdo,
+            'er': attacker.er,
+        }
+
+    def status(self, params: dict) -> dict:
+        return {
+            'gm_hash': self.metrics.gm_hash,
+            'loaded_at': self.loaded_at,
+            'workers': self.workers,
+            'requests': self.requests,
+            'in_flight': len(self._in_flight),
+            'cached_answers': len(self._answers),
+        }
+
+    async def _route(self, method: str, target: str) -> dict:
+        if method != 'GET':
+            raise QueryError(405, f'Method {method} not allowed')
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if url.path == '/top_attackers':
+            return await self.top_attackers(params)
+        handlers = {'/raid_bosses': self.raid_bosses, '/pokemon_metrics': self.pokemon_metrics, '/status': self.status}
+        if url.path not in handlers:
+            raise QueryError(404, f'Unknown path {url.path}')
+        return handlers[url.path](params)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.requests += 1
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in [b'\r\n', b'\n', b'']:  # headers, nothing here needs them
+                pass
+            if len(request_line) != 3:
+                raise QueryError(400, 'Bad request line')
+            status, answer = 200, await self._route(request_line[0], request_line[1])
+        except QueryError as e:
+            status, answer = e.status, {'error': str(e)}
+        except Exception as e:
+            status, answer = 500, {'error': f'{type(e).__name__}: {e}'}
+        body = json.dumps(answer).encode()
+        writer.write(
+            f'HTTP/1.1 {status} {self.STATUS_TEXT[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'.encode() + body
+        )
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080):
+        loop = asyncio.get_running_loop()
+        gm_stat = self._stat_gm()
+        self._swap(*await loop.run_in_executor(None, self._load), gm_stat)
+        watcher = asyncio.ensure_future(self._watch_gm())
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f'Serving gm {self.metrics.gm_hash[:16]} on http://{host}:{port}', flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Answer Metrics queries over HTTP/JSON from one resident catalog')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '--data-dir', help=f'where the gm, cpm and type tables are, {DATA_DIR_ENV} or data/ next to the code by default'
+    )
+    parser.add_argument('--workers', type=int, help='processes scoring top_attackers, the cpu count by default')
+    parser.add_argument('--hidden-power', action='store_true')
+    parser.add_argument('--result-cache', help='directory for a ResultCache the workers share')
+    parser.add_argument('--poll-interval', type=float, default=5, help='seconds between checks of the gm file')
+    args = parser.parse_args()
+    if args.data_dir:
+        REGISTRY.configure(args.data_dir)
+    service = QueryService(args.hidden_power, args.workers, args.result_cache, args.poll_interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import numpy as np
+from move import Move
+from defender import Defender
+from pokemon import Pokemon
+from batch_metrics import BatchMetrics
+
+
+class RaidSimulator:
+    # Plays the battles out instead of using PokemonMetrics' closed form. The attacker uses fast moves until it
+    # has the energy for its charged move. A move's damage lands when its damage window starts and only
+    # counts if the attacker hasn't fainted by then. Energy is capped at 100, and half of the damage taken
+    # comes back as energy. The boss waits 2s after each of its moves. It gets the 100/3 energy per fast move
+    # that the closed form's n assumes. A battle ends when the attacker faints or the time runs out.
+    #
+    # Every (row, boss fast move, boss charged move) battle is stepped at once, one attacker move per step,
+    # and dps/tdo/er are averaged over the boss's movesets like intake does.
+    MAX_ENERGY = 100
+    DEFENDER_DELAY_S = 2
+    DEFENDER_ENERGY_PER_FAST_MOVE = 100 / 3
+    TIME_LIMIT_S = 300
+
+    def __init__(
+            self,
+            movesets: list[tuple[Pokemon, bool, Move, Move]],
+            atk_iv: int = 15,
+            defn_iv: int = 15,
+            hp_iv: int = 15,
+            level: float = 40,
+    ):
+        self.movesets = movesets
+        self.batch = BatchMetrics(movesets, atk_iv, defn_iv, hp_iv, level)
+
+    def __len__(self):
+        return len(self.batch)
+
+    def calculate_metrics(self, defender: Defender) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if defender.pokemon is None:
+            raise ValueError('The simulator needs a defender pokemon to play out its moves')
+        batch = self.batch
+        f_moves = defender.pokemon.fast_moves if defender.fast_move is None else [defender.fast_move]
+        c_moves = defender.pokemon.charged_moves if defender.charged_move is None else [defender.charged_move]
+        pairs = len(f_moves) * len(c_moves)
+        # battle i is row i // pairs against the boss's (i % pairs)th fast x charged pair
+        row = np.repeat(np.arange(len(batch)), pairs)
+        fast_index = np.tile(np.repeat(np.arange(len(f_moves)), len(c_moves)), len(batch))
+        charged_index = np.tile(np.arange(len(c_moves)), len(batch) * len(f_moves))
+
+        fdmg, cdmg = batch.move_damage(defender)
+        attacker = {
+            'fdmg': fdmg[row],
+            'cdmg': cdmg[row],
+            'fe': batch.move_energy[batch.fast][row],
+            'ce': batch.move_energy[batch.charged][row],
+            'fdur': batch.move_duration[batch.fast][row],
+            'cdur': batch.move_duration[batch.charged][row],
+            'fdws': batch.move_dws[batch.fast][row],
+            'cdws': batch.move_dws[batch.charged][row],
+        }
+        boss = {
+            'fdmg': batch.defender_damage(f_moves, defender)[row, fast_index],
+            'cdmg': batch.defender_damage(c_moves, defender)[row, charged_index],
+            'ce': np.array([move.energy_delta for move in c_moves], dtype=float)[charged_index],
+            'fdur': np.array([move.duration_s for move in f_moves])[fast_index] + self.DEFENDER_DELAY_S,
+            'cdur': np.array([move.duration_s for move in c_moves])[charged_index] + self.DEFENDER_DELAY_S,
+            'fdws': np.array([move.damage_window_start_s for move in f_moves])[fast_index],
+            'cdws': np.array([move.damage_window_start_s for move in c_moves])[charged_index],
+        }
+        dealt, duration = self._simulate(attacker, boss, np.broadcast_to(batch.stm, (len(batch),))[row].astype(float))
+
+        dps = np.divide(dealt, duration, out=np.zeros_like(dealt), where=duration > 0)
+        tdo = dealt
+        er = (dps ** 3 * tdo) ** 0.25
+        return tuple(metric.reshape(len(batch), pairs).mean(axis=1) for metric in (dps, tdo, er))
+
+    def _simulate(self, attacker: dict, boss: dict, hp: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # total damage dealt and time until the attacker fainted (or the time limit) of every battle
+        battles = len(hp)
+        time = np.zeros(battles)
+        energy = np.zeros(battles)
+        dealt = np.zeros(battles)
+        fainted_at = np.full(battles, np.inf)
+        boss_start = np.zeros(battles)  # when the boss's current move started
+        boss_energy = np.zeros(battles)
+        duration = np.zeros(battles)
+
+        running = np.arange(battles)
+        while running.size:
+            charged = energy[running] >= attacker['ce'][running]
+            hit_time = time[running] + np.where(charged, attacker['cdws'][running], attacker['fdws'][running])
+            move_end = time[running] + np.where(charged, attacker['cdur'][running], attacker['fdur'][running])
+            energy[running] -= np.where(charged, attacker['ce'][running], 0)
+
+            # the boss's hits that land before this move is over
+            hitting = running
+            until = move_end
+            while hitting.size:
+                boss_charged = boss_energy[hitting] >= boss['ce'][hitting]
+                boss_hit = boss_start[hitting] + np.where(boss_charged, boss['cdws'][hitting], boss['fdws'][hitting])
+                due = boss_hit <= until
+                if not due.any():
+                    break
+                hit = hitting[due]
+                boss_charged = boss_charged[due]
+                damage = np.where(boss_charged, boss['cdmg'][hit], boss['fdmg'][hit])
+                hp[hit] -= damage
+                energy[hit] = np.minimum(energy[hit] + 0.5 * damage, self.MAX_ENERGY)
+                fainted_at[hit] = np.where(hp[hit] <= 0, boss_hit[due], np.inf)
+                boss_energy[hit] = np.where(
+                    boss_charged,
+                    boss_energy[hit] - boss['ce'][hit],
+                    np.minimum(boss_energy[hit] + self.DEFENDER_ENERGY_PER_FAST_MOVE, self.MAX_ENERGY)
+                )
+                boss_start[hit] += np.where(boss_charged, boss['cdur'][hit], boss['fdur'][hit])
+                still_up = hp[hit] > 0
+                hitting = hit[still_up]
+                until = until[due][still_up]
+
+            landed = fainted_at[running] > hit_time
+            dealt[running] += np.where(
+                landed, np.where(charged, attacker['cdmg'][running], attacker['fdmg'][running]), 0
+            )
+            gained = landed & ~charged
+            energy[running] = np.where(
+                gained, np.minimum(energy[running] + attacker['fe'][running], self.MAX_ENERGY), energy[running]
+            )
+            time[running] = move_end
+
+            done = (fainted_at[running] <= move_end) | (move_end >= self.TIME_LIMIT_S)
+            duration[running[done]] = np.minimum(fainted_at[running[done]], move_end[done])
+            running = running[~done]
+        return dealt, duration
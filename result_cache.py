@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import pickle
+from data_registry import REGISTRY
+
+CACHE_VERSION = 1
+
+
+class ResultCache:
+    # Query results pickled one per file as <gm hash>-<query hash>.pickle.
+    # File mtimes are bumped on every hit, the least recently used files go first once max_bytes is passed.
+
+    def __init__(self, directory: str = None, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory or REGISTRY.path('result_cache')
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, gm_hash: str, **params) -> str:
+        params['version'] = CACHE_VERSION
+        query_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        return f'{gm_hash[:16]}-{query_hash[:32]}'
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                value = pickle.load(cache_file)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return value
+
+    def put(self, key: str, value):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as cache_file:
+            pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:  # removed by another process in the meantime
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def invalidate(self, gm_hash: str = None):
+        # drops every entry not made from the gm with this hash, or everything without one
+        for _, _, path in self._entries():
+            if gm_hash is None or not os.path.basename(path).startswith(gm_hash[:16] + '-'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,81 @@
+import numpy as np
+from move import Move
+from pokemon import Pokemon
+
+
+class ResultColumns:
+    # Parallel arrays, one entry per ranked moveset. Pokemon and moves are stored once in the
+    # pokemon/moves tables and the columns only hold their indexes.
+    COLUMNS = {
+        'attacker': np.int32,
+        'fast_move': np.int32,
+        'charged_move': np.int32,
+        'is_shadow': np.bool_,
+        'elite_fast_move': np.bool_,
+        'elite_charged_move': np.bool_,
+        'dps': np.float64,
+        'tdo': np.float64,
+        'er': np.float64,
+    }
+
+    def __init__(self):
+        self.pokemon = []
+        self.moves = []
+        self._pokemon_ids = {}
+        self._move_ids = {}
+        self._columns = {name: [] for name in self.COLUMNS}
+        self._arrays = None
+
+    def _intern(self, table: list, ids: dict, value) -> int:
+        if id(value) not in ids:
+            ids[id(value)] = len(table)
+            table.append(value)
+        return ids[id(value)]
+
+    def append(
+            self,
+            attacker: Pokemon,
+            fast_move: Move,
+            charged_move: Move,
+            is_shadow: bool,
+            elite_fast_move: bool,
+            elite_charged_move: bool,
+            dps: float,
+            tdo: float,
+            er: float
+    ):
+        row = [
+            self._intern(self.pokemon, self._pokemon_ids, attacker),
+            self._intern(self.moves, self._move_ids, fast_move),
+            self._intern(self.moves, self._move_ids, charged_move),
+            is_shadow,
+            elite_fast_move,
+            elite_charged_move,
+            dps,
+            tdo,
+            er
+        ]
+        for name, value in zip(self.COLUMNS, row):
+            self._columns[name].append(value)
+        self._arrays = None
+
+    def __len__(self):
+        return len(self._columns['attacker'])
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name not in ResultColumns.COLUMNS:
+            raise AttributeError(name)
+        if self._arrays is None:
+            self._arrays = {
+                column: np.array(values, dtype=self.COLUMNS[column]) for column, values in self._columns.items()
+            }
+        return self._arrays[name]
+
+    def name(self, row: int) -> str:
+        attacker_name = self.pokemon[self.attacker[row]].name
+        return 'shadow ' + attacker_name if self.is_shadow[row] else attacker_name
+
+    def order(self, sort_by: int = 1) -> np.ndarray:
+        # row indexes from best to worst, ties keep their original order like list.sort(reverse=True)
+        metric = [self.dps, self.tdo, self.er][sort_by - 1]
+        return np.argsort(-metric, kind='stable')
@@ -0,0 +1,245 @@
+import argparse
+import copy
+import json
+import os
+import random
+
+TYPES = [
+    'normal',
+    'fighting',
+    'flying',
+    'poison',
+    'ground',
+    'rock',
+    'bug',
+    'ghost',
+    'steel',
+    'fire',
+    'water',
+    'grass',
+    'electric',
+    'psychic',
+    'ice',
+    'dragon',
+    'dark',
+    'fairy'
+]
+# attacking type -> (super effective against, not very effective against, immune)
+_MATCHUPS = {
+    'normal': ([], ['rock', 'steel'], ['ghost']),
+    'fighting': (
+        ['normal', 'rock', 'steel', 'ice', 'dark'], ['flying', 'poison', 'bug', 'psychic', 'fairy'], ['ghost']
+    ),
+    'flying': (['fighting', 'bug', 'grass'], ['rock', 'steel', 'electric'], []),
+    'poison': (['grass', 'fairy'], ['poison', 'ground', 'rock', 'ghost'], ['steel']),
+    'ground': (['poison', 'rock', 'steel', 'fire', 'electric'], ['bug', 'grass'], ['flying']),
+    'rock': (['flying', 'bug', 'fire', 'ice'], ['fighting', 'ground', 'steel'], []),
+    'bug': (['grass', 'psychic', 'dark'], ['fighting', 'flying', 'poison', 'ghost', 'steel', 'fire', 'fairy'], []),
+    'ghost': (['ghost', 'psychic'], ['dark'], ['normal']),
+    'steel': (['rock', 'ice', 'fairy'], ['steel', 'fire', 'water', 'electric'], []),
+    'fire': (['bug', 'steel', 'grass', 'ice'], ['rock', 'fire', 'water', 'dragon'], []),
+    'water': (['ground', 'rock', 'fire'], ['water', 'grass', 'dragon'], []),
+    'grass': (['ground', 'rock', 'water'], ['flying', 'poison', 'bug', 'steel', 'fire', 'grass', 'dragon'], []),
+    'electric': (['flying', 'water'], ['grass', 'electric', 'dragon'], ['ground']),
+    'psychic': (['fighting', 'poison'], ['steel', 'psychic'], ['dark']),
+    'ice': (['flying', 'ground', 'grass', 'dragon'], ['steel', 'fire', 'water', 'ice'], []),
+    'dragon': (['dragon'], ['steel'], ['fairy']),
+    'dark': (['ghost', 'psychic'], ['fighting', 'dark', 'fairy'], []),
+    'fairy': (['fighting', 'dragon', 'dark'], ['poison', 'steel', 'fire'], []),
+}
+# moves Metrics looks up by name, as (movementId, type, power, energyDelta, is fast)
+_NAMED_MOVES = [
+    ('RETURN', 'normal', 35, -33, False),
+    ('FRUSTRATION', 'normal', 10, -33, False),
+    ('HIDDEN_POWER_FAST', 'normal', 15, 8, True),
+    ('STRUGGLE', 'normal', 35, None, True),
+    ('FRENZY_PLANT', 'grass', 100, -50, False),
+    ('BLAST_BURN', 'fire', 110, -50, False),
+    ('HYDRO_CANNON', 'water', 80, -50, False),
+    ('DRAGON_ASCENT', 'flying', 150, -100, False),
+    ('SACRED_FIRE_PLUS', 'fire', 135, -100, False),
+    ('SACRED_FIRE_PLUS_PLUS', 'fire', 155, -100, False),
+]
+# the first pokemon get names that Metrics special cases
+_NAMED_POKEMON = ['RAYQUAZA', 'MEOWSCARADA', 'CINDERACE', 'INTELEON', 'HO_OH']
+
+
+def type_effectiveness() -> dict[str, dict[str, float]]:
+    table = {}
+    for attacking in TYPES:
+        super_effective, not_very_effective, immune = _MATCHUPS[attacking]
+        table[attacking] = {}
+        for defending in TYPES:
+            table[attacking][defending] = 1.0
+            if defending in super_effective:
+                table[attacking][defending] = 1.6
+            elif defending in not_very_effective:
+                table[attacking][defending] = 0.625
+            elif defending in immune:
+                table[attacking][defending] = 0.390625
+    return table
+
+
+def cpm_table(max_level: int = 55) -> list[float]:
+    # close to the real curve: 0.094 at level 1, 0.7903 at level 40, then a small flat step per level
+    table = []
+    for level in range(1, max_level + 1):
+        if level <= 40:
+            table.append(round(0.094 + (0.7903 - 0.094) * ((level - 1) / 39) ** 0.75, 8))
+        else:
+            table.append(round(0.7903 + (level - 40) * 0.005, 8))
+    return table
+
+
+def _move_entry(number: int, movement_id: str, typing: str, power: int, energy_delta: int, duration_ms: int) -> dict:
+    tid = f'V{number:04d}_MOVE_{movement_id}'
+    settings = {
+        'movementId': movement_id,
+        'pokemonType': 'POKEMON_TYPE_' + typing.upper(),
+        'damageWindowStartMs': int(duration_ms * 0.4),
+        'damageWindowEndMs': int(duration_ms * 0.7),
+        'durationMs': duration_ms,
+    }
+    if power is not None:
+        settings['power'] = power
+    if energy_delta is not None:
+        settings['energyDelta'] = energy_delta
+    return {'templateId': tid, 'data': {'templateId': tid, 'moveSettings': settings}}
+
+
+def _pokemon_entry(tid: str, settings: dict) -> dict:
+    return {'templateId': tid, 'data': {'templateId': tid, 'pokemonSettings': settings}}
+
+
+def generate_gm(
+        pokemon: int = 300,
+        moves: int = 200,
+        forms: float = 0.15,
+        megas: float = 0.05,
+        seed: int = 0
+) -> list[dict]:
+    # A PokeMiners style game master: moves, then every pokemon with its _NORMAL copy and sometimes an
+    # alolan form, with shadows, elite moves, classes, megas and hidden power spread over them at random
+    rnd = random.Random(seed)
+    gm = []
+    fast_moves = []
+    charged_moves = []
+    for movement_id, typing, power, energy_delta, is_fast in _NAMED_MOVES:
+        gm.append(_move_entry(len(gm) + 1, movement_id, typing, power, energy_delta, 1500 if is_fast else 2500))
+        if not is_fast and movement_id not in ['RETURN', 'FRUSTRATION']:
+            charged_moves.append(movement_id)
+    for i in range(moves):
+        typing = TYPES[i % len(TYPES)]
+        if i % 3 == 0:
+            movement_id = f'{typing.upper()}_MOVE_{i}_FAST'
+            power = rnd.randint(3, 20)
+            energy_delta = rnd.randint(4, 14)
+            duration_ms = rnd.choice([500, 1000, 1500])
+            fast_moves.append(movement_id)
+        else:
+            movement_id = f'{typing.upper()}_MOVE_{i}'
+            power = rnd.randint(40, 180) if i != 1 else None  # one move without power, like splash
+            energy_delta = -rnd.choice([33, 50, 100])
+            duration_ms = rnd.choice([1700, 2300, 3000, 3800])
+            charged_moves.append(movement_id)
+        gm.append(_move_entry(len(gm) + 1, movement_id, typing, power, energy_delta, duration_ms))
+
+    def settings(name: str, dex: int, type_1: str, type_2: str | None, stats: dict) -> dict:
+        pokemon_settings = {
+            'pokemonId': name,
+            'type': 'POKEMON_TYPE_' + type_1.upper(),
+            'stats': stats,
+            'quickMoves': rnd.sample(fast_moves, min(3, len(fast_moves))),
+            'cinematicMoves': rnd.sample(charged_moves, min(3, len(charged_moves))),
+        }
+        if dex % 11 == 0:
+            pokemon_settings['quickMoves'].append('HIDDEN_POWER_FAST')
+        if type_2 is not None and type_2 != type_1:
+            pokemon_settings['type2'] = 'POKEMON_TYPE_' + type_2.upper()
+        if rnd.random() < 0.3:
+            pokemon_settings['eliteQuickMove'] = rnd.sample(fast_moves, 1)
+        if rnd.random() < 0.3:
+            pokemon_settings['eliteCinematicMove'] = rnd.sample(charged_moves, 1)
+        if rnd.random() < 0.5:
+            pokemon_settings['shadow'] = {'shadowChargeMove': 'FRUSTRATION', 'purifiedChargeMove': 'RETURN'}
+        pokemon_class = rnd.random()
+        if pokemon_class < 0.2:
+            pokemon_settings['pokemonClass'] = 'POKEMON_CLASS_LEGENDARY'
+        elif pokemon_class < 0.23:
+            pokemon_settings['pokemonClass'] = 'POKEMON_CLASS_MYTHIC'
+        elif pokemon_class < 0.25:
+            pokemon_settings['pokemonClass'] = 'POKEMON_CLASS_ULTRA_BEAST'
+        if rnd.random() < megas:
+            pokemon_settings['tempEvoOverrides'] = [
+                {
+                    'tempEvoId': 'TEMP_EVOLUTION_MEGA',
+                    'stats': {stat: value + 40 for stat, value in stats.items()},
+                    'typeOverride1': 'POKEMON_TYPE_' + rnd.choice(TYPES).upper(),
+                },
+                {},  # the real gm has entries without a tempEvoId too
+            ]
+        return pokemon_settings
+
+    for dex in range(1, pokemon + 1):
+        name = _NAMED_POKEMON[dex - 1] if dex <= len(_NAMED_POKEMON) else f'MON{dex}'
+        stats = {
+            'baseStamina': rnd.randint(80, 300),
+            'baseAttack': rnd.randint(60, 320),
+            'baseDefense': rnd.randint(60, 300),
+        }
+        tid = f'V{dex:04d}_POKEMON_{name}'
+        base = settings(name, dex, rnd.choice(TYPES), rnd.choice(TYPES + [None] * 10), stats)
+        gm.append(_pokemon_entry(tid, base))
+        gm.append(_pokemon_entry(tid + '_NORMAL', copy.deepcopy(base)))
+        if rnd.random() < forms:
+            form_stats = {stat: value + 5 for stat, value in stats.items()}
+            gm.append(_pokemon_entry(tid + '_ALOLA', settings(name, dex, rnd.choice(TYPES), None, form_stats)))
+    # like the real honedge, without stats, Metrics patches them in from _pokemon_without_base_stats
+    honedge = settings('HONEDGE', 679, 'steel', 'ghost', {})
+    honedge.pop('tempEvoOverrides', None)
+    gm.append(_pokemon_entry('V0679_POKEMON_HONEDGE', honedge))
+    return gm
+
+
+def write_gm(gm_path: str, **kwargs):
+    # kwargs go to generate_gm
+    os.makedirs(os.path.dirname(gm_path) or '.', exist_ok=True)
+    with open(gm_path, 'w') as gm_file:
+        json.dump(generate_gm(**kwargs), gm_file, indent=4)
+
+
+def write_tables(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'type_effectiveness.json'), 'w') as type_file:
+        json.dump(type_effectiveness(), type_file, indent=4)
+    with open(os.path.join(directory, 'cpm.json'), 'w') as cpm_file:
+        json.dump(cpm_table(), cpm_file)
+
+
+def write_data_dir(directory: str, **kwargs):
+    # everything Metrics reads from the data directory, kwargs go to generate_gm
+    write_gm(os.path.join(directory, 'pokeminers_gm.json'), **kwargs)
+    write_tables(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic game master, type chart and cpm table')
+    parser.add_argument('directory')
+    parser.add_argument('--pokemon', type=int, default=300)
+    parser.add_argument('--moves', type=int, default=200)
+    parser.add_argument('--forms', type=float, default=0.15)
+    parser.add_argument('--megas', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_data_dir(
+        args.directory,
+        pokemon=args.pokemon,
+        moves=args.moves,
+        forms=args.forms,
+        megas=args.megas,
+        seed=args.seed
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import sys
+import numpy as np
+from data_registry import REGISTRY
+
+# The tables below are built from the registry's type table the first time one of them is used (see __getattr__),
+# so importing this module doesn't read anything. Code in here goes through _module to get the same behaviour.
+TABLES = [
+    'TYPE_DICT',
+    'TYPES',
+    'TYPE_IDS',
+    'NO_TYPE',
+    'EFFECTIVENESS',
+    'DUAL_TYPES',
+    'DUAL_TYPE_IDS',
+    'DUAL_TYPE_TABLE',
+    'EFFECTIVENESS_ROWS',
+    'DUAL_TYPE_ROWS',
+    'TYPINGS',
+]
+_module = sys.modules[__name__]
+
+
+def _build_tables(type_dict) -> dict:
+    types = list(type_dict)
+    type_ids = {typing: i for i, typing in enumerate(types)}
+    no_type = len(types)  # id of an empty type_2, neutral to everything
+    type_ids[''] = no_type
+
+    # effectiveness[attacking type id][defending type id], with a row and column of 1s for no_type
+    effectiveness = np.ones((len(types) + 1, len(types) + 1))
+    for attacking, row in type_dict.items():
+        for defending, value in row.items():
+            effectiveness[type_ids[attacking], type_ids[defending]] = value
+
+    # Every defensive typing: the 18 single types then the 153 dual types, plus a typeless column for Defender()
+    dual_types = [(i, no_type) for i in range(len(types))]
+    dual_types += [(i, j) for i in range(len(types)) for j in range(i + 1, len(types))]
+    dual_types.append((no_type, no_type))
+    dual_type_ids = {}
+    for column, (type_1, type_2) in enumerate(dual_types):
+        dual_type_ids[(type_1, type_2)] = column
+        dual_type_ids[(type_2, type_1)] = column
+    dual_type_table = np.array(
+        [[effectiveness[attacking, type_1] * effectiveness[attacking, type_2] for type_1, type_2 in dual_types]
+         for attacking in range(len(types) + 1)]
+    )
+    effectiveness.flags.writeable = False
+    dual_type_table.flags.writeable = False
+
+    return {
+        'TYPE_DICT': type_dict,
+        'TYPES': types,
+        'TYPE_IDS': type_ids,
+        'NO_TYPE': no_type,
+        'EFFECTIVENESS': effectiveness,
+        'DUAL_TYPES': dual_types,
+        'DUAL_TYPE_IDS': dual_type_ids,
+        'DUAL_TYPE_TABLE': dual_type_table,
+        # Plain lists are quicker than numpy for the one-at-a-time lookups of the scalar path
+        'EFFECTIVENESS_ROWS': effectiveness.tolist(),
+        'DUAL_TYPE_ROWS': dual_type_table.tolist(),
+        # (type_1, type_2) names -> (type_1 id, type_2 id, STAB mask, dual type column), so setting a type is one lookup
+        'TYPINGS': {
+            (type_1, type_2): (
+                type_ids[type_1],
+                type_ids[type_2],
+                ((1 << type_ids[type_1]) | (1 << type_ids[type_2])) & ~(1 << no_type),
+                dual_type_ids[(type_ids[type_1], type_ids[type_2])]
+            )
+            for type_1 in type_ids for type_2 in type_ids
+            if (type_ids[type_1], type_ids[type_2]) in dual_type_ids
+        },
+    }
+
+
+def load_tables():
+    if 'TYPINGS' not in globals():
+        globals().update(_build_tables(REGISTRY.type_effectiveness()))
+
+
+def __getattr__(name: str):
+    # only called for names that aren't module globals yet, once the tables are loaded lookups are plain again
+    if name not in TABLES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    load_tables()
+    return globals()[name]
+
+
+def type_id(typing: str) -> int:
+    return _module.TYPE_IDS[typing]
+
+
+def dual_type_id(type_1: str, type_2: str) -> int:
+    return _module.TYPINGS[(type_1, type_2)][3]
+
+
+def type_mask(type_1: str, type_2: str) -> int:
+    # bit i is set when the typing includes type id i, a move gets STAB when its type's bit is set
+    return _module.TYPINGS[(type_1, type_2)][2]
+
+
+class Typed:
+    # type_1/type_2 keep their integer ids, STAB mask and dual type column in sync whenever they are set
+    __slots__ = ('_type_1', '_type_2', 'type_1_id', 'type_2_id', 'type_mask', 'dual_type_id')
+
+    @property
+    def type_1(self) -> str:
+        return self._type_1
+
+    @type_1.setter
+    def type_1(self, value: str):
+        self._type_1 = value
+        self._update_type_ids()
+
+    @property
+    def type_2(self) -> str:
+        return self._type_2
+
+    @type_2.setter
+    def type_2(self, value: str):
+        self._type_2 = value
+        self._update_type_ids()
+
+    def set_types(self, type_1: str, type_2: str):
+        self._type_1 = type_1
+        self._type_2 = type_2
+        self._update_type_ids()
+
+    def _update_type_ids(self):
+        try:
+            typing = (self._type_1, self._type_2)
+        except AttributeError:  # first type set in __init__, the second one isn't there yet
+            return
+        self.type_1_id, self.type_2_id, self.type_mask, self.dual_type_id = _module.TYPINGS[typing]